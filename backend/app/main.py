@@ -1,26 +1,33 @@
 import os
+import re
+import json
+import asyncio
 import uuid
-from typing import List
-from collections import defaultdict
+import base64
+import hashlib
+from datetime import datetime
+from typing import List, Optional
 from dotenv import load_dotenv
 from jose import jwt
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Body, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Body, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client, Client
-from cachetools import TTLCache
 
-from app.services.parser import parse_chat
-from app.models.schema import UploadResponse, Message, DeepAnalysisRequest
-from app.services.sentiment import analyze_sentiment, sentiment_timeline
-from app.services.analysis import reply_time_analysis
-from app.services.initiation_analysis import initiation_analysis
+from app.services.parser import parse_chat_store
+from app.models.schema import UploadResponse, DeepAnalysisRequest
+from app.services.sentiment import shutdown_pool
 from app.services.health_score import compute_health_score
-from app.services.toxicity import detect_toxicity
+from app.services import llm, metrics, profiling, toxicity
+from app.services.features import calculate_features, with_toxicity
+from app.services.pipeline import ChatSession
+from app.services.jobs import Job, JobManager, NullProgress, QueueFull
+from app.services.session_cache import make_session_cache
+from app.services.repository import AnalysisNotFound, AnalysisRepository, VersionConflict
 from app.services.cluster import ConversationClassifier
-from app.services.coach import generate_relationship_narrative, generate_decision_advice
-from app.services.semantic import analyze_semantics
-from app.services.trend_analysis import evaluate_trends
+from app.services.coach import coach_cache, generate_relationship_narrative, generate_decision_advice
+from app.services.trend_analysis import TREND_WINDOW, TrendStats, current_snapshot_of, evaluate_trends_from_stats
 
 
 load_dotenv()
@@ -30,11 +37,18 @@ supabase: Client = create_client(
     os.getenv("SUPABASE_ANON_KEY")
 )
 
+# Non-blocking data access (DB calls run on a dedicated thread pool)
+repo = AnalysisRepository(supabase)
+
 classifier = ConversationClassifier()
 security = HTTPBearer()
 
-# Cache for storing parsed messages. ID -> Message List. TTL=600s (10 min)
-message_cache = TTLCache(maxsize=100, ttl=600)
+# Cache for storing parsed chats. ID -> ChatSession (messages + memoized stage results), stored compressed.
+# SESSION_CACHE_BACKEND=file shares it between workers; bounded by SESSION_CACHE_MAX_BYTES, TTL=600s (10 min)
+message_cache = make_session_cache()
+
+# Background deep analyses (DEEP_JOB_CONCURRENCY / DEEP_JOB_QUEUE_DEPTH)
+deep_jobs = JobManager()
 
 
 app = FastAPI(title="CONVOQ API")
@@ -45,67 +59,86 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing", "X-Profile-Id"],
 )
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Stage durations in a Server-Timing header, and into the /metrics histograms"""
+    with metrics.request_scope(method=request.method) as timings:
+        try:
+            response = await call_next(request)
+        finally:
+            # Route template, not the raw path, so ids don't become label values
+            route = request.scope.get("route")
+            timings.endpoint = getattr(route, "path", "unmatched")
+        timings.status = str(response.status_code)
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+async def profile_requests(request: Request, call_next):
+    """
+    Requests with the PROFILE_SECRET in X-Profile-Secret can profile one
+    analysis with an X-Profile: 1 | cprofile header or ?profile=;
+    see services/profiling.py
+    """
+    mode = None
+    if request.url.path.startswith("/analyze") and profiling.is_authorized(request.headers):
+        mode = profiling.requested_mode(request.headers, request.query_params)
+    if mode is None:
+        return await call_next(request)
+
+    async with profiling.capture(mode) as profile_id:
+        response = await call_next(request)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+# Only installed when profiling is configured; otherwise requests never pass through it
+if profiling.PROFILE_SECRET:
+    app.middleware("http")(profile_requests)
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
     try:
-        payload = jwt.get_unverified_claims(token)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-        return user_id
+        payload = jwt.get_unverified_claims(credentials.credentials)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    return user_id
 
-def calculate_features(messages: List[Message], reply_analysis: dict, sentiment_data: list, initiations: dict, toxicity_data: dict):
-    avg_replies = list(reply_analysis["avg_reply_time"].values())
-    reply_balance = min(avg_replies) / max(avg_replies) if len(avg_replies) >= 2 and max(avg_replies) > 0 else 0.5
-    
-    init_counts = list(initiations.values())
-    initiation_balance = min(init_counts) / max(init_counts) if len(init_counts) >= 2 and max(init_counts) > 0 else 0.5
-    
-    sentiments = [s["sentiment"] for s in sentiment_data]
-    if sentiments:
-        avg_sentiment = sum(sentiments) / len(sentiments)
-        variance = sum((s - avg_sentiment) ** 2 for s in sentiments) / len(sentiments)
-        sentiment_stability = max(0, 1 - variance)
-    else:
-        sentiment_stability = 0.5
-    
-    msg_lengths = defaultdict(list)
-    for msg in messages:
-        msg_lengths[msg.sender].append(len(msg.message))
-    
-    avg_lengths = {s: sum(l)/len(l) for s, l in msg_lengths.items()}
-    if len(avg_lengths) >= 2:
-        l_vals = list(avg_lengths.values())
-        msg_length_balance = min(l_vals) / max(l_vals) if max(l_vals) > 0 else 0.5
-    else:
-        msg_length_balance = 0.5
-    
-    emoji_count = sum(1 for m in messages if any(c in m.message for c in ['😊', '😂', '❤️', '👍', '🎉']))
-    emoji_density = min(emoji_count / len(messages), 1.0) if messages else 0
-    tox_rate = toxicity_data.get("toxicity_rate", 0) / 100
-    return {
-        "reply_time_balance": round(reply_balance, 3),
-        "initiation_balance": round(initiation_balance, 3),
-        "sentiment_stability": round(sentiment_stability, 3),
-        "msg_length_balance": round(msg_length_balance, 3),
-        "emoji_density": round(emoji_density, 3),
-        "toxicity_impact": round(tox_rate, 3)
-    }
+@app.on_event("startup")
+async def startup():
+    # Token counting falls back to a length estimate until this finishes
+    llm.warm_encoding()
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_pool()
+    await toxicity.client.aclose()
+    await llm.aclose()
+    repo.close()
 
 @app.get("/")
 def root():
     return {"status": "online"}
 
-def get_db_user_uuid(clerk_id: str) -> str:
-    user_query = supabase.table("users").select("id").eq("clerk_id", clerk_id).execute()
-    if not user_query.data:
-        new_user = supabase.table("users").insert({"clerk_id": clerk_id}).execute()
-        return new_user.data[0]["id"]
-    return user_query.data[0]["id"]
+def verify_metrics_token(request: Request):
+    """Operational endpoints (/stats, /metrics): only served with METRICS_TOKEN set, to holders of it"""
+    if not metrics.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not metrics.scrape_authorized(request.headers.get("authorization", "")):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+@app.get("/stats", dependencies=[Depends(verify_metrics_token)])
+def stats():
+    return {"toxicity_verdicts": toxicity.verdict_cache.stats(), "coach_cache": coach_cache.stats(), "sessions": message_cache.stats(), "deep_jobs": deep_jobs.stats()}
+
+@app.get("/metrics", dependencies=[Depends(verify_metrics_token)])
+def prometheus_metrics():
+    # Per process: with several workers, scrape each one
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/analyze/fast")
 async def analyze_fast(file: UploadFile = File(...), date_format: str = Form("auto"), user_id: str = Depends(verify_token)):
@@ -116,25 +149,27 @@ async def analyze_fast(file: UploadFile = File(...), date_format: str = Form("au
         # if not allowed:
         #     raise HTTPException(status_code=429, detail=rate_msg)
         
-        content = await file.read()
-        messages = parse_chat(content.decode("utf-8"), date_format=date_format)
+        # Stream the upload through the parser into a columnar store
+        with metrics.stage("parse"):
+            messages = parse_chat_store(file.file, date_format=date_format)
+        metrics.set_message_count(len(messages))
         
         if not messages:
             raise HTTPException(status_code=400, detail="No messages found")
 
         # --- FAST ANALYSIS ---
-        reply_analysis = reply_time_analysis(messages)
+        # Stage outputs are memoized on the session and reused by /analyze/deep
+        session = ChatSession(messages)
+        results = await session.run("reply_times", "timeline", "initiations", "semantic", "base_features")
+        reply_analysis = results["reply_times"]
+        initiations = results["initiations"]
         # Skip Toxicity: just return empty placeholder
         toxicity_data = {"toxicity_rate": 0.0, "toxic_messages": [], "status": "locked"} 
         
-        sentiment_data = analyze_sentiment(messages)
-        timeline = sentiment_timeline(sentiment_data)
-        initiations = initiation_analysis(messages, gap_hours=6)
-        semantic_data = analyze_semantics(messages, toxicity_data=toxicity_data) # Might be weak without toxic info
-        
-        features = calculate_features(messages, reply_analysis, sentiment_data, initiations, toxicity_data)
+        features = with_toxicity(results["base_features"], toxicity_data)
         health_score = compute_health_score(features)
-        persona = classifier.predict(features)
+        with metrics.stage("persona"):
+            persona = classifier.predict(features)
 
         # Placeholders for deep analysis
         coach_narrative = "Locked. Click 'Unlock Deep Insights' to generate."
@@ -143,19 +178,19 @@ async def analyze_fast(file: UploadFile = File(...), date_format: str = Form("au
 
     
         # DB operations
-        db_uuid = get_db_user_uuid(user_id)
+        db_uuid = await repo.get_user_uuid(user_id)
         
         full_data = {
             "total_messages": len(messages),
-            "participants": list(set(msg.sender for msg in messages)),
+            "participants": list(messages.senders),
             "toxicity": toxicity_data,
             "health_score": health_score,
             "persona_tag": persona, 
             "features": features,
             "reply_times": reply_analysis,
-            "sentiment": {"total_messages": len(sentiment_data), "timeline": timeline},
+            "sentiment": {"total_messages": len(messages), "timeline": results["timeline"]},
             "initiations": initiations,
-            "semantic_analysis": semantic_data,
+            "semantic_analysis": results["semantic"], # Might be weak without toxic info
             "coach_summary": coach_narrative,
             "trend_analysis": trend_results,
             "decision_advice": decision_advice,
@@ -163,22 +198,24 @@ async def analyze_fast(file: UploadFile = File(...), date_format: str = Form("au
             "analysis_status": "pending_deep"
         }
         
-        insert_resp = supabase.table("analyses").insert({
+        inserted = await repo.insert_analysis({
             "user_id": db_uuid,
             "total_messages": len(messages),
             "health_score": health_score,
             "persona_tag": persona,
             "full_data": full_data
-        }).execute()
+        })
         
-        analysis_id = insert_resp.data[0]["id"]
+        analysis_id = inserted["id"]
         
         # --- CACHE MESSAGES ---
         cache_key = str(uuid.uuid4())
-        message_cache[cache_key] = messages
+        await message_cache.aput(cache_key, session)
         
         full_data["cache_key"] = cache_key
         full_data["analysis_id"] = analysis_id
+        full_data["version"] = inserted.get("version", 0)
+        full_data["date_format"] = messages.date_format
         
         return full_data
 
@@ -186,96 +223,141 @@ async def analyze_fast(file: UploadFile = File(...), date_format: str = Form("au
         print(f"Fast Analysis Error: {str(e)}")
         raise HTTPException(status_code=500, detail="Fast Analysis Failed")
 
-@app.post("/analyze/deep")
-async def analyze_deep(request: DeepAnalysisRequest, user_id: str = Depends(verify_token)):
-    try:
-        messages = message_cache.get(request.cache_key)
-        if not messages:
-            raise HTTPException(status_code=400, detail="Session expired. Please re-upload the file.")
-            
-        # --- DEEP ANALYSIS ---
-        toxicity_data = detect_toxicity(messages) # Slow HP request
-        
-        # Need to reconstruct some features with real toxicity
-        # We need features to run coach/trend correctly if they depend on toxicity
-        # Re-fetch fast data? Or just recalculate needed parts.
-        # Let's recalculate features.
-        
-        # ... We need existing data from DB to merge? Or just recalculate features. 
-        # Easier to just run the specialized functions.
+async def run_deep_analysis(request: DeepAnalysisRequest, user_id: str, progress=NullProgress()):
+    """Deep analysis of a cached chat; reports each stage to `progress` (a Job when run in the background)"""
+    session = await message_cache.aget(request.cache_key)
+    if not session:
+        raise HTTPException(status_code=400, detail="Session expired. Please re-upload the file.")
+    messages = session.messages
+    metrics.set_message_count(len(messages))
         
-        reply_analysis = reply_time_analysis(messages) # Fast enough to re-run
-        sentiment_data = analyze_sentiment(messages)   # Fast enough
-        initiations = initiation_analysis(messages, gap_hours=6)
-        
-        features = calculate_features(messages, reply_analysis, sentiment_data, initiations, toxicity_data)
+    # --- DEEP ANALYSIS ---
+    # Independent branches run concurrently, so latency follows the longest one:
+    #   toxicity ─┬─> coach
+    #   stats ────┴─> trends ─> advice
+    async def score():
+        # Only toxicity is new; the fast-path stages come back from the session memo
+        await progress.stage_started("toxicity")
+        toxicity_data, results = await asyncio.gather(
+            session.get("toxicity"), # Batched, concurrent HF requests
+            session.run("initiations", "base_features")
+        )
+
+        # Recombine the chat features with the real toxicity
+        features = with_toxicity(results["base_features"], toxicity_data)
         health_score = compute_health_score(features) # Might change due to toxicity
-        
-        # Trends
-        db_uuid = get_db_user_uuid(user_id)
-        history_query = supabase.table("analyses") \
-            .select("id, total_messages, health_score, full_data, created_at") \
-            .eq("user_id", db_uuid) \
-            .neq("id", request.analysis_id) .order("created_at", desc=True) \
-            .limit(5) \
-            .execute()
-            
-        past_history = history_query.data if history_query.data else []
-        
-        trend_results = evaluate_trends(
-            current_stats={
-                "health_score": health_score, 
-                "toxicity": toxicity_data, 
+        await progress.stage_done("toxicity", {"toxicity": toxicity_data, "features": features, "health_score": health_score})
+        return toxicity_data, results["initiations"], features, health_score
+
+    async def load_trend_stats():
+        # Trends: from the user's rolling stats record, no history scan
+        await progress.stage_started("trends")
+        with metrics.stage("trend_stats"):
+            db_uuid = await repo.get_user_uuid(user_id)
+            stats_row = await repo.get_trend_stats(db_uuid)
+            if stats_row is None:
+                # First deep analysis since stats were introduced: seed from recent history once
+                return db_uuid, TrendStats.from_history(await repo.recent_history(db_uuid, exclude_id=request.analysis_id, limit=TREND_WINDOW)), None
+            return db_uuid, TrendStats.from_row(stats_row), stats_row.get("version", 0)
+
+    (toxicity_data, initiations, features, health_score), (db_uuid, trend_stats, trend_version) = await asyncio.gather(score(), load_trend_stats())
+    current_stats = {
+        "health_score": health_score,
+        "toxicity": toxicity_data,
+        "features": features
+    }
+
+    async def coach():
+        await progress.stage_started("coach")
+        with metrics.stage("coach"):
+            coach_narrative = await generate_relationship_narrative({
+                "participants": list(messages.senders),
+                "health_score": health_score,
+                "initiations": initiations,
                 "features": features
-            },
-            history=past_history
-        )
-        
-        coach_narrative = generate_relationship_narrative({
-            "participants": list(set(msg.sender for msg in messages)),
-            "health_score": health_score,
-            "initiations": initiations,
-            "features": features
-        })
-        
+            })
+        await progress.stage_done("coach", {"coach_summary": coach_narrative})
+        return coach_narrative
+
+    async def trends_and_advice():
+        trend_results = evaluate_trends_from_stats(current_stats, trend_stats.excluding(request.analysis_id))
+        await progress.stage_done("trends", {"trend_analysis": trend_results})
+
         # Extract recent messages for tone matching
+        await progress.stage_started("advice")
         recent_msgs_data = []
         if messages:
             # Take last 8 to ensure we get enough context
             for m in messages[-8:]:
                 recent_msgs_data.append({"sender": m.sender, "message": m.message})
 
-        decision_advice = generate_decision_advice(trend_results, recent_messages=recent_msgs_data)
-        
-        # --- UPDATE DB ---
-        update_payload = {
-            "toxicity": toxicity_data,
-            "health_score": health_score,
-            "features": features,
-            "trend_analysis": trend_results,
-            "coach_summary": coach_narrative,
-            "decision_advice": decision_advice,
-            "analysis_status": "complete"
-        }
-        
-        # Fetch current record to merge deep fields... or simple merge in frontend?
-        # Ideally we update the JSON in DB. Supabase handles JSON updates but replacing the whole object is safer/easier here.
-        # We need the full object.
-        
-        # Let's get the current record
-        curr_rec = supabase.table("analyses").select("full_data").eq("id", request.analysis_id).execute()
-        if not curr_rec.data:
-             raise HTTPException(status_code=404, detail="Analysis not found")
-             
-        full_data = curr_rec.data[0]["full_data"]
-        full_data.update(update_payload)
-        
-        supabase.table("analyses").update({
-            "health_score": health_score,
-            "full_data": full_data
-        }).eq("id", request.analysis_id).execute()
-        
-        return full_data
+        with metrics.stage("advice"):
+            decision_advice = await generate_decision_advice(trend_results, recent_messages=recent_msgs_data)
+        await progress.stage_done("advice", {"decision_advice": decision_advice})
+        return trend_results, decision_advice
+
+    coach_narrative, (trend_results, decision_advice) = await asyncio.gather(coach(), trends_and_advice())
+    
+    # --- UPDATE DB ---
+    await progress.stage_started("save")
+    update_payload = {
+        "toxicity": toxicity_data,
+        "health_score": health_score,
+        "features": features,
+        "trend_analysis": trend_results,
+        "coach_summary": coach_narrative,
+        "decision_advice": decision_advice,
+        "analysis_status": "complete"
+    }
+    
+    # Merged into full_data server-side in one statement; with a version from
+    # the client, a concurrent deep run on the same analysis gets a 409
+    try:
+        with metrics.stage("save"):
+            version = await repo.merge_analysis_fields(
+                db_uuid,
+                request.analysis_id,
+                update_payload,
+                health_score=health_score,
+                expected_version=request.version
+            )
+    except AnalysisNotFound:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    # Cached sessions are copies; store it again so the toxicity result is reused
+    await message_cache.aput(request.cache_key, session)
+
+    await save_trend_point(db_uuid, request.analysis_id, current_snapshot_of(current_stats), trend_stats, trend_version)
+    await progress.stage_done("save")
+    
+    # Only the deep fields; clients merge them into the fast result they hold
+    return {**update_payload, "analysis_id": request.analysis_id, "version": version}
+
+# Concurrent deep analyses of one user are rare; a few re-reads settle them
+TREND_SAVE_ATTEMPTS = 5
+
+async def save_trend_point(db_uuid: str, analysis_id, snapshot: dict, trend_stats: TrendStats, version: Optional[int]):
+    """
+    Add this analysis to the user's trend record. The write is conditional
+    on the version it was read at; when another analysis of the same user
+    saved in between, the record is read again and the point re-applied.
+    """
+    for _ in range(TREND_SAVE_ATTEMPTS):
+        try:
+            await repo.save_trend_stats(db_uuid, trend_stats.updated(analysis_id, snapshot).to_row(), expected_version=version)
+            return
+        except VersionConflict:
+            stats_row = await repo.get_trend_stats(db_uuid)
+            trend_stats = TrendStats.from_row(stats_row)
+            version = stats_row.get("version", 0) if stats_row else None
+    print(f"Trend stats of {db_uuid} not saved: still conflicting after {TREND_SAVE_ATTEMPTS} attempts")
+
+@app.post("/analyze/deep")
+async def analyze_deep(request: DeepAnalysisRequest, user_id: str = Depends(verify_token)):
+    try:
+        return await run_deep_analysis(request, user_id)
 
     except HTTPException as he:
         raise he
@@ -283,19 +365,117 @@ async def analyze_deep(request: DeepAnalysisRequest, user_id: str = Depends(veri
         print(f"Deep Analysis Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Deep Analysis Failed: {str(e)}")
 
+@app.post("/analyze/deep/jobs", status_code=202)
+async def submit_deep_analysis(request: DeepAnalysisRequest, user_id: str = Depends(verify_token)):
+    """Queue a deep analysis and return at once; poll /jobs/{id} or stream /jobs/{id}/events"""
+    if not await message_cache.acontains(request.cache_key):
+        raise HTTPException(status_code=400, detail="Session expired. Please re-upload the file.")
+
+    try:
+        # Timed in a scope of its own: the job outlives this request
+        job = deep_jobs.submit(user_id, lambda job: metrics.scoped("deep_job", run_deep_analysis(request, user_id, progress=job)))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return {"job_id": job.id, "status": job.status}
+
+def get_user_job(job_id: str, user_id: str) -> Job:
+    job = deep_jobs.get(job_id)
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(verify_token)):
+    return get_user_job(job_id, user_id).snapshot()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, user_id: str = Depends(verify_token)):
+    job = get_user_job(job_id, user_id)
+
+    async def server_sent_events():
+        async for event in job.stream():
+            yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(server_sent_events(), media_type="text/event-stream")
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Fraction of a second and "Z" offset, which fromisoformat only accepts in 3.11+
+ISO_FRACTION = re.compile(r"\.(\d+)")
+
+def parse_iso_datetime(value: str) -> datetime:
+    value = ISO_FRACTION.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value, count=1)
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+def decode_cursor(cursor: str):
+    """
+    (created_at, id) of a history cursor. Both are parsed and re-serialized,
+    so nothing from the client reaches the query filter verbatim.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, analysis_id = json.loads(raw)
+        created_at = parse_iso_datetime(created_at)
+        if isinstance(analysis_id, bool) or not isinstance(analysis_id, int):
+            raise ValueError("Invalid id")
+        return created_at, analysis_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def conditional_json(request: Request, data, headers: Optional[dict] = None) -> Response:
+    """JSON response with a content ETag; 304 when the client already has it"""
+    body = json.dumps(data, default=str).encode()
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/history")
-async def get_analysis_history(user_id: str = Depends(verify_token)):
+async def get_analysis_history(
+    request: Request,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(verify_token)
+):
+    """
+    Summaries of the user's analyses, newest first. When more exist, the
+    X-Next-Cursor header holds the cursor for the next page.
+    """
+    before = decode_cursor(cursor) if cursor else None
     try:
-        db_uuid = get_db_user_uuid(user_id)
-        history = supabase.table("analyses") \
-            .select("id, total_messages, health_score, persona_tag, created_at, full_data") \
-            .eq("user_id", db_uuid) \
-            .order("created_at", desc=True) \
-            .execute()
-        return history.data
+        db_uuid = await repo.get_user_uuid(user_id)
+        # One extra row tells whether another page follows
+        rows = await repo.list_history(db_uuid, limit=limit + 1, before=before)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
 
+    page = rows[:limit]
+    headers = {"X-Next-Cursor": encode_cursor(page[-1])} if len(rows) > limit else {}
+    return conditional_json(request, page, headers)
+
+@app.get("/history/{analysis_id}")
+async def get_analysis_detail(analysis_id: int, request: Request, user_id: str = Depends(verify_token)):
+    try:
+        db_uuid = await repo.get_user_uuid(user_id)
+        analysis = await repo.get_analysis(db_uuid, analysis_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch analysis: {str(e)}")
+
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return conditional_json(request, analysis)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
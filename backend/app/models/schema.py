@@ -1,10 +1,13 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional
 
 class Message(BaseModel):
     timestamp: str
     sender: str
     message: str
+    # Seconds since 1970-01-01 of the (naive, wall-clock) timestamp.
+    # Parsed once by the parser; None when the timestamp could not be parsed.
+    epoch: Optional[int] = None
 
 class UploadResponse(BaseModel):
     total_messages: int
@@ -12,4 +15,6 @@ class UploadResponse(BaseModel):
 
 class DeepAnalysisRequest(BaseModel):
     cache_key: str
-    analysis_id: Union[str, int]
\ No newline at end of file
+    analysis_id: int
+    # Version returned with the analysis; the deep update is rejected (409) if it changed since
+    version: Optional[int] = None
\ No newline at end of file
@@ -0,0 +1,235 @@
+import json
+import struct
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from app.models.schema import Message
+
+# Epoch column value for timestamps the parser could not read
+NO_EPOCH = -(2 ** 63)
+
+# (timestamp, sender, message, epoch) as produced by the parser
+Record = Tuple[str, str, str, Optional[int]]
+
+_STORE_MAGIC = b"CVM1"
+
+
+def pack_sections(magic: bytes, sections: Sequence[bytes]) -> bytes:
+    """magic, section count, then each section as (uint64 length, bytes)"""
+    parts = [magic, struct.pack("<I", len(sections))]
+    for section in sections:
+        parts.append(struct.pack("<Q", len(section)))
+        parts.append(section)
+    return b"".join(parts)
+
+
+def unpack_sections(magic: bytes, data: bytes) -> List[memoryview]:
+    view = memoryview(data)
+    if bytes(view[:len(magic)]) != magic:
+        raise ValueError("Unrecognized serialized data")
+    pos = len(magic)
+    (count,) = struct.unpack_from("<I", view, pos)
+    pos += 4
+    sections = []
+    for _ in range(count):
+        (size,) = struct.unpack_from("<Q", view, pos)
+        pos += 8
+        sections.append(view[pos:pos + size])
+        pos += size
+    return sections
+
+
+def _array_from(typecode: str, data: memoryview) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    return column
+
+
+class MessageRow:
+    """
+    Lightweight read-only view of one row of a MessageStore.
+    Exposes the same attributes as Message, so row-at-a-time code keeps working.
+    """
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: "MessageStore", index: int):
+        self._store = store
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        """Position of the row in its store"""
+        return self._index
+
+    @property
+    def timestamp(self) -> str:
+        return self._store.timestamp(self._index)
+
+    @property
+    def sender(self) -> str:
+        return self._store.sender(self._index)
+
+    @property
+    def message(self) -> str:
+        return self._store.message(self._index)
+
+    @property
+    def epoch(self) -> Optional[int]:
+        return self._store.epoch(self._index)
+
+    def to_message(self) -> Message:
+        return Message(timestamp=self.timestamp, sender=self.sender, message=self.message, epoch=self.epoch)
+
+    def __repr__(self):
+        return f"MessageRow({self._index}, {self.sender!r}: {self.message!r})"
+
+
+class MessageStore:
+    """
+    Columnar, array-backed chat.
+
+    Columns:
+    - epochs:       int64 seconds (NO_EPOCH when unparsed)
+    - sender_codes: index into `senders` (table in first-appearance order)
+    - lengths:      message length in characters
+    - message text and timestamp strings live in two UTF-8 buffers with offsets
+
+    A 100k-message chat is a handful of flat buffers instead of 100k
+    pydantic objects.
+    """
+
+    def __init__(self):
+        self.epochs = array("q")
+        self.sender_codes = array("I")
+        self.lengths = array("I")
+        self.senders: List[str] = []
+        self._sender_index: Dict[str, int] = {}
+
+        self._text = bytearray()
+        self._text_offsets = array("Q", [0])
+        self._ts = bytearray()
+        self._ts_offsets = array("Q", [0])
+
+        # How the parser read the timestamps (parser.DateFormat.describe()); not serialized
+        self.date_format: Optional[Dict] = None
+
+    # ---------------------------
+    # Building
+    # ---------------------------
+    @classmethod
+    def from_records(cls, records: Iterable[Record]) -> "MessageStore":
+        store = cls()
+        for timestamp, sender, message, epoch in records:
+            store.append(timestamp, sender, message, epoch)
+        return store
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message]) -> "MessageStore":
+        return cls.from_records((m.timestamp, m.sender, m.message, m.epoch) for m in messages)
+
+    def append(self, timestamp: str, sender: str, message: str, epoch: Optional[int] = None):
+        code = self._sender_index.get(sender)
+        if code is None:
+            code = len(self.senders)
+            self._sender_index[sender] = code
+            self.senders.append(sender)
+
+        self.epochs.append(NO_EPOCH if epoch is None else epoch)
+        self.sender_codes.append(code)
+        self.lengths.append(len(message))
+
+        self._text += message.encode("utf-8")
+        self._text_offsets.append(len(self._text))
+        self._ts += timestamp.encode("utf-8")
+        self._ts_offsets.append(len(self._ts))
+
+    # ---------------------------
+    # Serialization
+    # ---------------------------
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary form: the sender table and the raw column buffers.
+        Arrays are in native byte order, so it is meant for caches on the
+        same machine, not for long-term storage.
+        """
+        return pack_sections(_STORE_MAGIC, [
+            json.dumps(self.senders).encode("utf-8"),
+            self.epochs.tobytes(),
+            self.sender_codes.tobytes(),
+            self.lengths.tobytes(),
+            bytes(self._text),
+            self._text_offsets.tobytes(),
+            bytes(self._ts),
+            self._ts_offsets.tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MessageStore":
+        senders, epochs, codes, lengths, text, text_offsets, ts, ts_offsets = unpack_sections(_STORE_MAGIC, data)
+        store = cls()
+        store.senders = json.loads(bytes(senders).decode("utf-8"))
+        store._sender_index = {sender: code for code, sender in enumerate(store.senders)}
+        store.epochs = _array_from("q", epochs)
+        store.sender_codes = _array_from("I", codes)
+        store.lengths = _array_from("I", lengths)
+        store._text = bytearray(text)
+        store._text_offsets = _array_from("Q", text_offsets)
+        store._ts = bytearray(ts)
+        store._ts_offsets = _array_from("Q", ts_offsets)
+        return store
+
+    # ---------------------------
+    # Column access
+    # ---------------------------
+    def message(self, i: int) -> str:
+        return self._text[self._text_offsets[i]:self._text_offsets[i + 1]].decode("utf-8")
+
+    def timestamp(self, i: int) -> str:
+        return self._ts[self._ts_offsets[i]:self._ts_offsets[i + 1]].decode("utf-8")
+
+    def sender(self, i: int) -> str:
+        return self.senders[self.sender_codes[i]]
+
+    def epoch(self, i: int) -> Optional[int]:
+        epoch = self.epochs[i]
+        return None if epoch == NO_EPOCH else epoch
+
+    def texts(self) -> Iterator[str]:
+        """All message texts in order, without building rows"""
+        text, offsets = self._text, self._text_offsets
+        for i in range(len(self.epochs)):
+            yield text[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and buffers"""
+        arrays = (self.epochs, self.sender_codes, self.lengths, self._text_offsets, self._ts_offsets)
+        return (
+            sum(a.itemsize * len(a) for a in arrays)
+            + len(self._text) + len(self._ts)
+            + sum(len(s) for s in self.senders)
+        )
+
+    # ---------------------------
+    # Sequence protocol (row views)
+    # ---------------------------
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def __bool__(self) -> bool:
+        return len(self.epochs) > 0
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return [MessageRow(self, i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("message index out of range")
+        return MessageRow(self, key)
+
+    def __iter__(self) -> Iterator[MessageRow]:
+        for i in range(len(self)):
+            yield MessageRow(self, i)
+
+    def to_messages(self) -> List[Message]:
+        return [row.to_message() for row in self]
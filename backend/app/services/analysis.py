@@ -1,7 +1,6 @@
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from collections import defaultdict
-from typing import List
-from app.models.schema import Message
+from app.models.store import MessageStore, NO_EPOCH
 
 def parse_timestamp(timestamp: str) -> datetime:
     """Parse timestamp with multiple format support"""
@@ -25,57 +24,85 @@ def parse_timestamp(timestamp: str) -> datetime:
     
     raise ValueError(f"Unable to parse timestamp: {timestamp}")
 
-def reply_time_analysis(messages: List[Message]):
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+
+def to_epoch(dt: datetime) -> int:
+    """Naive datetime -> whole seconds since 1970-01-01 (no timezone shift)"""
+    return int((dt - EPOCH).total_seconds())
+
+def epoch_hour(epoch: int) -> int:
+    """Hour of day (0-23) of an epoch produced by to_epoch"""
+    return epoch // 3600 % 24
+
+def epoch_date(epoch: int) -> date:
+    """Calendar date of an epoch produced by to_epoch"""
+    return EPOCH_DATE + timedelta(days=epoch // 86400)
+
+def reply_time_analysis(messages: MessageStore):
     """Analyze reply times between senders"""
-    reply_times = defaultdict(list)
-    all_gaps = []
+    epochs = messages.epochs
+    codes = messages.sender_codes
+
+    # Per-sender running totals instead of keeping every gap around
+    reply_sums = defaultdict(float)
+    reply_counts = defaultdict(int)
+    fastest = slowest = None  # (minutes, index) of the extreme replies
+    total_replies = 0
     
-    for i in range(1, len(messages)):
-        current_msg = messages[i]
-        prev_msg = messages[i-1]
+    for i in range(1, len(epochs)):
+        current_time = epochs[i]
+        prev_time = epochs[i-1]
         
-        try:
-            current_time = parse_timestamp(current_msg.timestamp)
-            prev_time = parse_timestamp(prev_msg.timestamp)
-            time_diff = (current_time - prev_time).total_seconds() / 60
-            
-            if time_diff > 0:
-                gap_data = {
-                    "minutes": round(time_diff, 2),
-                    "timestamp": current_msg.timestamp,
-                    "from": prev_msg.sender,
-                    "to": current_msg.sender
-                }
-                if current_msg.sender != prev_msg.sender:
-                    all_gaps.append(gap_data)
-                    reply_times[current_msg.sender].append(gap_data)
-        except:
+        # Timestamps were parsed once by the parser; skip the ones it couldn't read
+        if current_time == NO_EPOCH or prev_time == NO_EPOCH:
             continue
+
+        time_diff = (current_time - prev_time) / 60
+        
+        if time_diff > 0 and codes[i] != codes[i-1]:
+            minutes = round(time_diff, 2)
+            reply_sums[codes[i]] += minutes
+            reply_counts[codes[i]] += 1
+            total_replies += 1
+
+            # Strict comparisons keep the first occurrence, like min()/max()
+            if fastest is None or minutes < fastest[0]:
+                fastest = (minutes, i)
+            if slowest is None or minutes > slowest[0]:
+                slowest = (minutes, i)
+
+    def gap_data(extreme):
+        if extreme is None:
+            return None
+        minutes, i = extreme
+        return {
+            "minutes": minutes,
+            "timestamp": messages.timestamp(i),
+            "from": messages.sender(i-1),
+            "to": messages.sender(i)
+        }
+
     avg_reply_time = {}
-    for sender, times in reply_times.items():
-        if times:
-            avg_minutes = sum(t["minutes"] for t in times) / len(times)
-            avg_reply_time[sender] = round(avg_minutes, 2)
+    for code, total in reply_sums.items():
+        avg_reply_time[messages.senders[code]] = round(total / reply_counts[code], 2)
     
     # Find longest ghosting period
-    longest_ghost = max(all_gaps, key=lambda x: x["minutes"]) if all_gaps else None
+    longest_ghost = gap_data(slowest)
     
     # Peak conversation hours
     hours_count = defaultdict(int)
-    for i, msg in enumerate(messages):
-        try:
-            dt = parse_timestamp(msg.timestamp)
-            hours_count[dt.hour] += 1
-        except:
-            continue
+    for epoch in epochs:
+        if epoch != NO_EPOCH:
+            hours_count[epoch_hour(epoch)] += 1
     
     peak_hours = sorted(hours_count.items(), key=lambda x: x[1], reverse=True)[:3]
     
     return {
         "avg_reply_time": avg_reply_time,
-        "fastest_reply": min(all_gaps, key=lambda x: x["minutes"]) if all_gaps else None,
-        "slowest_reply": max(all_gaps, key=lambda x: x["minutes"]) if all_gaps else None,
+        "fastest_reply": gap_data(fastest),
+        "slowest_reply": longest_ghost,
         "longest_ghosting": longest_ghost,
         "peak_hours": [{"hour": h, "count": c} for h, c in peak_hours],
-        "total_replies_analyzed": len(all_gaps)
+        "total_replies_analyzed": total_replies
     }
\ No newline at end of file
@@ -1,6 +1,8 @@
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import MinMaxScaler
+from typing import List, Optional, Sequence, Union
+
+# Column order of a feature matrix
+FEATURE_ORDER = ['reply_time_balance', 'initiation_balance', 'sentiment_stability', 'msg_length_balance', 'emoji_density']
 
 class ConversationClassifier:
     def __init__(self):
@@ -12,10 +14,14 @@ class ConversationClassifier:
             [0.50, 0.50, 0.90, 0.40, 0.00], # Cluster 2: Professional / Dry
             [0.60, 0.60, 0.30, 0.60, 0.40]  # Cluster 3: High-Energy / Emotional
         ])
-        
-        self.scaler = MinMaxScaler()
-        self.model = KMeans(n_clusters=4, init=self.anchors, n_init=1)
-        
+
+        # Precomputed once: the anchor bounds. Each query is min-max scaled
+        # together with the anchors (as the old per-request MinMaxScaler fit
+        # did), which only needs these bounds plus the query itself. With one
+        # anchor per cluster the centroids are the scaled anchors.
+        self._anchor_min = self.anchors.min(axis=0)
+        self._anchor_max = self.anchors.max(axis=0)
+
         self.persona_names = {
             0: "Synchronized Duo",
             1: "One-Sided / Ghosting Risk",
@@ -24,33 +30,58 @@ class ConversationClassifier:
         }
 
     def predict(self, features: dict):
-        # 1. HARD OVERRIDE (The "Human Vibe" Logic)
-        # If the length balance is perfect and they are using emojis, 
-        # it's NOT Professional, even if reply time is a bit off.
-        if features.get('toxicity_impact', 0) > 0.1:
-            return "High Conflict / Toxic"
+        return self.predict_many([features])[0]
+
+    def predict_many(
+        self,
+        features: Union[np.ndarray, Sequence[dict]],
+        toxicity_impact: Optional[Sequence[float]] = None
+    ) -> List[str]:
+        """
+        Classify many chats at once.
+        `features` is either a list of feature dicts or an (n, 5) matrix in
+        FEATURE_ORDER; with a matrix, pass toxicity_impact separately.
+        """
+        if isinstance(features, np.ndarray):
+            vectors = features.astype(float).reshape(-1, len(FEATURE_ORDER))
+            toxicity = np.zeros(len(vectors)) if toxicity_impact is None else np.asarray(toxicity_impact, dtype=float)
+        else:
+            vectors = np.array([[f[k] for k in FEATURE_ORDER] for f in features], dtype=float).reshape(-1, len(FEATURE_ORDER))
+            toxicity = np.array([f.get('toxicity_impact', 0) for f in features], dtype=float)
+
+        cluster_ids = self._nearest_anchor(vectors)
+
+        personas = []
+        for vector, tox, cluster_id in zip(vectors, toxicity, cluster_ids):
+            # 1. HARD OVERRIDE (The "Human Vibe" Logic)
+            # If the length balance is perfect and they are using emojis,
+            # it's NOT Professional, even if reply time is a bit off.
+            if tox > 0.1:
+                personas.append("High Conflict / Toxic")
+                continue
 
+            predicted_persona = self.persona_names[int(cluster_id)]
+
+            # 3. SAFETY CHECK
+            # If categorized as Dry but has good sentiment and length balance, shift it up.
+            if predicted_persona == "Professional / Dry Texter" and vector[2] > 0.8:
+                if vector[0] > 0.3:
+                    predicted_persona = self.persona_names[0] # Upgrade to Synchronized Duo
+
+            personas.append(predicted_persona)
+
+        return personas
+
+    def _nearest_anchor(self, vectors: np.ndarray) -> np.ndarray:
         # 2. VECTOR PREDICTION
-        vector = np.array([[
-            features['reply_time_balance'],
-            features['initiation_balance'],
-            features['sentiment_stability'],
-            features['msg_length_balance'],
-            features['emoji_density']
-        ]])
-        
-        combined_data = np.vstack([self.anchors, vector])
-        scaled_data = self.scaler.fit_transform(combined_data)
-        
-        self.model.fit(scaled_data[:-1])
-        cluster_id = self.model.predict(scaled_data[-1:])
-        
-        predicted_persona = self.persona_names[cluster_id[0]]
-
-        # 3. SAFETY CHECK
-        # If categorized as Dry but has good sentiment and length balance, shift it up.
-        if predicted_persona == "Professional / Dry Texter" and features['sentiment_stability'] > 0.8:
-            if features['reply_time_balance'] > 0.3:
-                return self.persona_names[0] # Upgrade to Synchronized Duo
-
-        return predicted_persona
\ No newline at end of file
+        # Per-row min-max bounds over the anchors plus that row
+        low = np.minimum(self._anchor_min, vectors)
+        span = np.maximum(self._anchor_max, vectors) - low
+        # Same zero-range handling as MinMaxScaler
+        span[span < 10 * np.finfo(span.dtype).eps] = 1.0
+
+        scaled_vectors = (vectors - low) / span                                            # (n, 5)
+        scaled_anchors = (self.anchors[None, :, :] - low[:, None, :]) / span[:, None, :]  # (n, 4, 5)
+
+        distances = ((scaled_anchors - scaled_vectors[:, None, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1)
@@ -1,32 +1,80 @@
-import os
-from groq import Groq
+import re
 import json
+from typing import Dict, Tuple
+from app.services.llm import GROQ_MODEL, get_client
+from app.services.llm_cache import LLMCache, cache_key, quantize
 
-def generate_relationship_narrative(metrics: dict) -> str:
+# Bump when a prompt changes so cached answers to the old one are not reused
+NARRATIVE_TEMPLATE_VERSION = 2
+ADVICE_TEMPLATE_VERSION = 1
+
+# Shared by all requests (LLM_CACHE_SIZE / LLM_CACHE_TTL / LLM_CACHE_DB)
+coach_cache = LLMCache()
+
+_PERSON = re.compile(r"\bPerson \d+\b")
+
+
+def narrative_inputs(metrics: dict) -> Tuple[Dict, Dict[str, str]]:
+    """
+    Prompt inputs for the narrative: participants as "Person 1", "Person 2", ...,
+    initiations as rounded shares and the balances on a 0.05 grid, so chats
+    with near-identical metrics share one cached answer.
+    Returns the inputs and the label -> real name map.
+    """
+    participants = list(metrics.get('participants') or [])
+    names = {f"Person {i}": name for i, name in enumerate(participants, 1)}
+    labels = {name: label for label, name in names.items()}
+
+    initiations = metrics.get('initiations') or {}
+    total = sum(initiations.values())
+    if total:
+        shares = ", ".join(
+            f"{labels.get(name, 'Unknown')}: {quantize(100 * count / total, 5):g}%"
+            for name, count in initiations.items()
+        )
+    else:
+        shares = 'N/A'
+
+    features = metrics.get('features', {})
+    inputs = {
+        "participants": ", ".join(names) or 'Unknown',
+        "health_score": quantize(metrics.get('health_score', 'N/A'), 1),
+        "initiations": shares,
+    }
+    for name in ('reply_time_balance', 'sentiment_stability', 'msg_length_balance'):
+        inputs[name] = quantize(features.get(name, 'N/A'), 0.05)
+    return inputs, names
+
+
+def with_names(text: str, names: Dict[str, str]) -> str:
+    return _PERSON.sub(lambda m: names.get(m.group(0), m.group(0)), text)
+
+
+async def generate_relationship_narrative(metrics: dict) -> str:
     """
     Generates a Gen-Z style communication vibe check based on conversation metrics.
     Metrics-only analysis (no message content).
     """
 
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    client = get_client()
+    if client is None:
         return "Coach offline. Drop a GROQ_API_KEY to wake me up."
 
-    client = Groq(api_key=api_key)
+    inputs, names = narrative_inputs(metrics)
 
     prompt = f"""
     You are analyzing conversation dynamics using quantitative metrics only.
 
     METRICS:
-    - Participants: {metrics.get('participants', 'Unknown')}
-    - Health Score: {metrics.get('health_score', 'N/A')}/100
+    - Participants: {inputs['participants']}
+    - Health Score: {inputs['health_score']}/100
       (Below 50 = unhealthy, 50–70 = mixed, above 70 = healthy)
-    - Initiation Balance: {metrics.get('initiations', 'N/A')}
-    - Reply Time Balance: {metrics.get('features', {}).get('reply_time_balance', 'N/A')}
+    - Initiation Balance: {inputs['initiations']}
+    - Reply Time Balance: {inputs['reply_time_balance']}
       (1.0 = perfectly balanced)
-    - Sentiment Stability: {metrics.get('features', {}).get('sentiment_stability', 'N/A')}
+    - Sentiment Stability: {inputs['sentiment_stability']}
       (Lower = volatile emotions)
-    - Message Length Balance: {metrics.get('features', {}).get('msg_length_balance', 'N/A')}
+    - Message Length Balance: {inputs['msg_length_balance']}
       (Lower = one person carrying the convo)
 
     TASK:
@@ -44,9 +92,9 @@ def generate_relationship_narrative(metrics: dict) -> str:
     Gen-Z, concise, insightful. No corporate therapy-speak.
     """
 
-    try:
-        completion = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
+    async def call():
+        completion = await client.chat.completions.create(
+            model=GROQ_MODEL,
             temperature=0.6,
             max_tokens=250,
             messages=[
@@ -63,26 +111,29 @@ def generate_relationship_narrative(metrics: dict) -> str:
 
         return completion.choices[0].message.content.strip()
 
-    except Exception as e:
-        print(f"Groq API Error: {e}")
+    # Cached; on an API error or timeout the last answer for these inputs is served
+    narrative = await coach_cache.get_or_call(
+        cache_key(GROQ_MODEL, "relationship_narrative", NARRATIVE_TEMPLATE_VERSION, inputs),
+        call
+    )
+    if narrative is None:
         return "Coach dipped due to an API issue. Check the logs."
+    return with_names(narrative, names)
 
-def generate_decision_advice(trend_data: dict, recent_messages: list = None) -> dict:
+async def generate_decision_advice(trend_data: dict, recent_messages: list = None) -> dict:
     """
     Generates specific advice and reply suggestions based on the trend decision.
     """
-    api_key = os.getenv("GROQ_API_KEY")
+    client = get_client()
     # Default fallback
     fallback = {
         "advice": ["Reflect on your boundaries.", "Consider taking a break."],
         "reply_suggestions": ["Hey, I need some space.", "Can we talk later?", "I've been feeling a bit off about our chats."]
     }
 
-    if not api_key:
+    if client is None:
         return fallback
 
-    client = Groq(api_key=api_key)
-
     decision = trend_data.get("decision", "Unknown")
     
     if decision == "Not Enough Data":
@@ -128,23 +179,26 @@ def generate_decision_advice(trend_data: dict, recent_messages: list = None) ->
     If "Continue", they should be engaging and natural.
     """
     
-    try:
-        completion = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
+    async def call():
+        completion = await client.chat.completions.create(
+            model=GROQ_MODEL,
             temperature=0.7,
             max_tokens=400,
             response_format={"type": "json_object"},
             messages=[
                 {
-                    "role": "system", 
+                    "role": "system",
                     "content": "You are a relationship strategy expert. Return valid JSON only."
                 },
                 {"role": "user", "content": prompt}
             ]
         )
-        
+
         return json.loads(completion.choices[0].message.content)
-        
-    except Exception as e:
-        print(f"Groq Advice Error: {e}")
-        return fallback
+
+    # Reply suggestions mimic the recent messages, so they are part of the key
+    advice = await coach_cache.get_or_call(
+        cache_key(GROQ_MODEL, "decision_advice", ADVICE_TEMPLATE_VERSION, [decision, reasons, recent_messages or []]),
+        call
+    )
+    return advice if advice is not None else fallback
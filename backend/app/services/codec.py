@@ -0,0 +1,95 @@
+import os
+import zlib
+import struct
+import threading
+from typing import Callable, Dict, Tuple
+
+# Preferred codec for new entries: "zstd", "lz4", "zlib" or "none".
+# Default: the best one importable here (zstandard, then lz4, then zlib).
+CACHE_CODEC = os.getenv("SESSION_CACHE_CODEC")
+# Speed over ratio: compression runs on the /analyze/fast path
+ZLIB_LEVEL = int(os.getenv("SESSION_CACHE_ZLIB_LEVEL", "1"))
+
+# magic, codec id, uncompressed size
+_HEADER = struct.Struct("<2sBQ")
+_MAGIC = b"CZ"
+
+
+class Codec:
+    def __init__(self, name: str, codec_id: int, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]):
+        self.name = name
+        self.id = codec_id
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _available() -> Dict[str, Codec]:
+    codecs = {
+        "none": Codec("none", 0, bytes, bytes),
+        "zlib": Codec("zlib", 1, lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress),
+    }
+    try:
+        import zstandard
+        # A (de)compressor must not be used by two threads at once, and the
+        # session cache (de)compresses on executor threads: one pair per thread
+        local = threading.local()
+
+        def zstd_compress(data: bytes) -> bytes:
+            if not hasattr(local, "compressor"):
+                local.compressor = zstandard.ZstdCompressor(level=3)
+            return local.compressor.compress(data)
+
+        def zstd_decompress(data: bytes) -> bytes:
+            if not hasattr(local, "decompressor"):
+                local.decompressor = zstandard.ZstdDecompressor()
+            # Frames carry their content size, so decompress() needs no hint
+            return local.decompressor.decompress(data)
+
+        codecs["zstd"] = Codec("zstd", 2, zstd_compress, zstd_decompress)
+    except ImportError:
+        pass
+    try:
+        import lz4.frame
+        codecs["lz4"] = Codec("lz4", 3, lz4.frame.compress, lz4.frame.decompress)
+    except ImportError:
+        pass
+    return codecs
+
+
+CODECS = _available()
+_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def default_codec() -> Codec:
+    if CACHE_CODEC:
+        if CACHE_CODEC not in CODECS:
+            raise ValueError(f"Unknown or unavailable codec: {CACHE_CODEC}")
+        return CODECS[CACHE_CODEC]
+    for name in ("zstd", "lz4", "zlib"):
+        if name in CODECS:
+            return CODECS[name]
+
+
+def encode(data: bytes, codec: Codec = None) -> bytes:
+    """Compressed payload with a small header naming the codec and the original size"""
+    codec = codec or default_codec()
+    return _HEADER.pack(_MAGIC, codec.id, len(data)) + codec.compress(data)
+
+
+def read_header(blob: bytes) -> Tuple[Codec, int]:
+    """(codec, uncompressed size) of an encoded payload, without decompressing it"""
+    magic, codec_id, raw_size = _HEADER.unpack_from(blob)
+    if magic != _MAGIC:
+        raise ValueError("Not an encoded cache payload")
+    codec = _BY_ID.get(codec_id)
+    if codec is None:
+        raise ValueError(f"Payload uses codec {codec_id}, which is not available here")
+    return codec, raw_size
+
+
+def decode(blob: bytes) -> bytes:
+    codec, _ = read_header(blob)
+    return codec.decompress(memoryview(blob)[_HEADER.size:])
+
+
+HEADER_SIZE = _HEADER.size
@@ -0,0 +1,52 @@
+from collections import defaultdict
+from typing import Sequence
+from app.models.store import MessageStore
+
+EMOJIS = ['😊', '😂', '❤️', '👍', '🎉']
+
+def message_features(messages: MessageStore, reply_analysis: dict, sentiments: Sequence[float], initiations: dict):
+    """Features that depend only on the chat itself (everything but toxicity)"""
+    avg_replies = list(reply_analysis["avg_reply_time"].values())
+    reply_balance = min(avg_replies) / max(avg_replies) if len(avg_replies) >= 2 and max(avg_replies) > 0 else 0.5
+    
+    init_counts = list(initiations.values())
+    initiation_balance = min(init_counts) / max(init_counts) if len(init_counts) >= 2 and max(init_counts) > 0 else 0.5
+    
+    if sentiments:
+        avg_sentiment = sum(sentiments) / len(sentiments)
+        variance = sum((s - avg_sentiment) ** 2 for s in sentiments) / len(sentiments)
+        sentiment_stability = max(0, 1 - variance)
+    else:
+        sentiment_stability = 0.5
+    
+    length_sums = defaultdict(int)
+    length_counts = defaultdict(int)
+    for code, length in zip(messages.sender_codes, messages.lengths):
+        length_sums[code] += length
+        length_counts[code] += 1
+    
+    avg_lengths = {messages.senders[c]: total/length_counts[c] for c, total in length_sums.items()}
+    if len(avg_lengths) >= 2:
+        l_vals = list(avg_lengths.values())
+        msg_length_balance = min(l_vals) / max(l_vals) if max(l_vals) > 0 else 0.5
+    else:
+        msg_length_balance = 0.5
+    
+    emoji_count = sum(1 for text in messages.texts() if any(c in text for c in EMOJIS))
+    emoji_density = min(emoji_count / len(messages), 1.0) if messages else 0
+    return {
+        "reply_time_balance": round(reply_balance, 3),
+        "initiation_balance": round(initiation_balance, 3),
+        "sentiment_stability": round(sentiment_stability, 3),
+        "msg_length_balance": round(msg_length_balance, 3),
+        "emoji_density": round(emoji_density, 3)
+    }
+
+def with_toxicity(base_features: dict, toxicity_data: dict):
+    """Cheap recombination of the chat features with a toxicity result"""
+    tox_rate = toxicity_data.get("toxicity_rate", 0) / 100
+    return {**base_features, "toxicity_impact": round(tox_rate, 3)}
+
+def calculate_features(messages: MessageStore, reply_analysis: dict, sentiment_data: list, initiations: dict, toxicity_data: dict):
+    sentiments = [s["sentiment"] for s in sentiment_data]
+    return with_toxicity(message_features(messages, reply_analysis, sentiments, initiations), toxicity_data)
@@ -1,25 +1,20 @@
-from datetime import datetime
 from collections import defaultdict
-from app.services.analysis import parse_timestamp
+from app.models.store import NO_EPOCH
 
 def initiation_analysis(messages, gap_hours=6):
     initiations = defaultdict(int)
+    senders = messages.senders
+    gap_seconds = gap_hours * 3600
 
     prev_time = None
 
-    for i, msg in enumerate(messages):
-        try:
-            current_time = parse_timestamp(msg.timestamp)
-        except ValueError:
+    for current_time, code in zip(messages.epochs, messages.sender_codes):
+        if current_time == NO_EPOCH:
             continue
 
-        # First message always initiates
-        if i == 0:
-            initiations[msg.sender] += 1
-        else:
-            gap = (current_time - prev_time).total_seconds() / 3600
-            if gap >= gap_hours:
-                initiations[msg.sender] += 1
+        # First (timed) message always initiates
+        if prev_time is None or current_time - prev_time >= gap_seconds:
+            initiations[senders[code]] += 1
 
         prev_time = current_time
 
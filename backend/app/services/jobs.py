@@ -0,0 +1,154 @@
+import os
+import time
+import uuid
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from cachetools import TTLCache
+
+# How many jobs may run at once, and how many may wait for a slot
+JOB_CONCURRENCY = int(os.getenv("DEEP_JOB_CONCURRENCY", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("DEEP_JOB_QUEUE_DEPTH", "50"))
+# Finished jobs stay pollable for this long
+JOB_TTL = int(os.getenv("DEEP_JOB_TTL", "3600"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class NullProgress:
+    """Progress sink for work that runs inline in a request"""
+
+    async def stage_started(self, stage: str):
+        pass
+
+    async def stage_done(self, stage: str, data: Any = None):
+        pass
+
+
+class Job:
+    """
+    One background unit of work. Progress is an append-only list of events
+    ({"event": ..., "stage": ..., "data": ...}) so late subscribers can replay it.
+    """
+
+    def __init__(self, user_id: str):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.status = "queued"
+        self.stages: Dict[str, str] = {}
+        self.result: Any = None
+        self.error: Optional[Dict] = None
+        self.created_at = time.time()
+        self.events: List[Dict] = []
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("complete", "failed")
+
+    async def _emit(self, event: Dict):
+        self.events.append(event)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def stage_started(self, stage: str):
+        self.stages[stage] = "running"
+        await self._emit({"event": "stage", "stage": stage, "status": "running"})
+
+    async def stage_done(self, stage: str, data: Any = None):
+        """Mark a stage finished and push its partial result to subscribers"""
+        self.stages[stage] = "done"
+        await self._emit({"event": "stage", "stage": stage, "status": "done", "data": data})
+
+    async def _finish(self, status: str, result: Any = None, error: Optional[Dict] = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        await self._emit({"event": status, "data": result if status == "complete" else error})
+
+    def snapshot(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stages": self.stages,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    async def stream(self) -> AsyncIterator[Dict]:
+        """All events so far, then new ones as they land, until the job finishes"""
+        sent = 0
+        while True:
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.finished:
+                return
+            async with self._changed:
+                if sent == len(self.events):
+                    await self._changed.wait()
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded number of concurrent slots with a bounded wait queue.
+    Jobs live in this process only: with several workers, polls and event
+    streams must reach the worker that accepted the job (see README).
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, queue_depth: int = JOB_QUEUE_DEPTH, ttl: int = JOB_TTL):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.jobs = TTLCache(maxsize=10000, ttl=ttl)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+        self.queued = 0
+        self.running = 0
+
+    def submit(self, user_id: str, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        if self.queued >= self.queue_depth:
+            raise QueueFull("Too many deep analyses waiting, try again shortly.")
+
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        job = Job(user_id)
+        self.jobs[job.id] = job
+        self.queued += 1
+
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        started = False
+        try:
+            async with self._slots:
+                self.queued -= 1
+                started = True
+                self.running += 1
+                job.status = "running"
+                try:
+                    result = await work(job)
+                    await job._finish("complete", result=result)
+                except Exception as e:
+                    status_code = getattr(e, "status_code", 500)
+                    detail = getattr(e, "detail", str(e))
+                    print(f"Job {job.id} failed: {detail}")
+                    await job._finish("failed", error={"status_code": status_code, "detail": detail})
+                finally:
+                    self.running -= 1
+        except asyncio.CancelledError:
+            if not started:
+                self.queued -= 1
+            await job._finish("failed", error={"status_code": 503, "detail": "Job cancelled"})
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self.queued, "running": self.running, "concurrency": self.concurrency, "queue_depth": self.queue_depth}
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Optional
+from groq import AsyncGroq
+
+GROQ_MODEL = "llama-3.1-8b-instant"
+
+# "groq" or "stub" (deterministic local answers, no network; for tests and offline runs)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()
+
+# Token counts use tiktoken's cl100k_base (close to Llama's tokenizer). The
+# encoding is loaded in a background thread, started at app startup; tiktoken
+# reads it from TIKTOKEN_CACHE_DIR when the file is there (the Docker image
+# ships it) and downloads it otherwise. Until it is loaded, or when loading
+# failed (offline), counts fall back to ~4 characters per token.
+TOKEN_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4
+# Seconds before another load is tried after a failure, or after one that hangs
+TOKEN_ENCODING_RETRY = float(os.getenv("TOKEN_ENCODING_RETRY", "300"))
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_encoding = None
+_encoding_lock = threading.Lock()
+# monotonic time of the last load attempt; None before the first one
+_encoding_attempt: Optional[float] = None
+
+
+class StubLLM:
+    """
+    Stand-in for AsyncGroq with the same chat.completions.create call.
+    The answer depends only on the request, so repeated calls agree.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.calls = 0
+
+    async def _create(self, model: str, messages: list, response_format: Optional[dict] = None, **kwargs):
+        self.calls += 1
+        prompt = "\n".join(m["content"] for m in messages)
+        tag = hashlib.sha1(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:8]
+
+        if response_format and response_format.get("type") == "json_object":
+            if '"advice"' in prompt:
+                content = json.dumps({
+                    "advice": [f"Stub tip {i} ({tag})" for i in range(1, 4)],
+                    "reply_suggestions": [f"Stub reply {i} ({tag})" for i in range(1, 4)]
+                })
+            else:
+                content = json.dumps({"events": []})
+        else:
+            content = f"Stub coach summary ({tag})."
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def close(self):
+        pass
+
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning("tiktoken unavailable (%s), estimating tokens from length; retrying in %.0fs", e, TOKEN_ENCODING_RETRY)
+
+
+def warm_encoding():
+    """
+    Start loading the encoding in a background thread, unless it is loaded
+    or the last attempt started under TOKEN_ENCODING_RETRY ago (so a failed
+    or hung load is retried after that delay). Never blocks: the download
+    inside tiktoken has no timeout of its own.
+    """
+    global _encoding_attempt
+    now = time.monotonic()
+    with _encoding_lock:
+        if _encoding is not None:
+            return
+        if _encoding_attempt is not None and now - _encoding_attempt < TOKEN_ENCODING_RETRY:
+            return
+        _encoding_attempt = now
+    threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True).start()
+
+
+def _get_encoding():
+    if _encoding is None:
+        warm_encoding()
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text within max_tokens"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def get_client():
+    """
+    The process-wide LLM client, created on first use so every call shares
+    one connection pool. None when GROQ_API_KEY is not set (stub excepted).
+    """
+    global _client
+    if _client is None:
+        if LLM_BACKEND == "stub":
+            _client = StubLLM()
+        else:
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                return None
+            _client = AsyncGroq(api_key=api_key)
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+from cachetools import LRUCache, TTLCache
+from app.services.metrics import external_call
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+# Optional on-disk store shared by restarts and workers, e.g. /var/lib/convoq/llm.db
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")
+# Past this, a cached (even expired) answer is served instead of waiting on the provider
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+
+
+def cache_key(model: str, template: str, version: int, inputs: Any) -> str:
+    """Content address of one prompt: model, template name and version, and its (quantized) inputs"""
+    raw = json.dumps([model, template, version, inputs], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def quantize(value: Any, step: float) -> Any:
+    """Round a metric to a grid so near-identical inputs share a cache entry"""
+    if not isinstance(value, (int, float)):
+        return value
+    return round(round(value / step) * step, 6)
+
+
+class LLMCache:
+    """
+    LLM answers keyed by cache_key. Fresh entries live in a TTL+LRU map; the
+    last answer for every key is kept (LRU, no TTL) as a stale copy to fall
+    back on when the provider fails or is slow. The optional SQLite store
+    keeps both across restarts; async callers reach it through aget / aput,
+    which query it in a worker thread (the lock serializes the connection).
+    """
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: int = LLM_CACHE_TTL, db_path: Optional[str] = LLM_CACHE_DB):
+        self.ttl = ttl
+        self._fresh = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._stale = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.errors = 0
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        with self._lock:
+            value = self._fresh.get(key)
+            if value is not None:
+                return value
+            if allow_stale and key in self._stale:
+                return self._stale[key]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        if time.time() - row[1] < self.ttl:
+            with self._lock:
+                self._fresh[key] = self._stale[key] = value
+            return value
+        return value if allow_stale else None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._fresh[key] = self._stale[key] = value
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time())
+                )
+                self._db.commit()
+
+    async def aget(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        if self._db is None:
+            return self.get(key, allow_stale)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, key, allow_stale)
+
+    async def aput(self, key: str, value: Any):
+        if self._db is None:
+            return self.put(key, value)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.put, key, value)
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Any]], timeout: float = LLM_TIMEOUT) -> Optional[Any]:
+        """
+        Cached answer for `key`, or call() and cache its result. If the call
+        fails or times out, the last known answer is served (None if there is
+        none). Failures are never cached.
+        """
+        value = await self.aget(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        try:
+            with external_call("llm"):
+                value = await asyncio.wait_for(call(), timeout=timeout)
+        except Exception as e:
+            self.errors += 1
+            print(f"LLM call failed ({type(e).__name__}: {e}), trying a cached answer")
+            stale = await self.aget(key, allow_stale=True)
+            if stale is not None:
+                self.stale_served += 1
+            return stale
+
+        await self.aput(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_served": self.stale_served,
+            "errors": self.errors,
+            "size": len(self._fresh),
+        }
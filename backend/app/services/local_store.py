@@ -0,0 +1,90 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from app.services.repository import AnalysisId, check_merge_result
+
+
+class SQLiteAnalysisStore:
+    """
+    Local stand-in for the analyses table, for tests and offline runs.
+    merge_analysis_fields behaves like the Postgres function of the same
+    name: a single UPDATE that shallow-merges top-level keys and bumps the
+    version, guarded by an optional expected version, on the owner's row
+    only (anyone else's is not_found). Ids are assigned on insert, like the
+    bigint identity column they stand in for.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                total_messages INTEGER,
+                health_score REAL,
+                persona_tag TEXT,
+                full_data TEXT NOT NULL DEFAULT '{}',
+                version INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+            )
+        """)
+        self._db.commit()
+
+    def insert_analysis(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO analyses (user_id, total_messages, health_score, persona_tag, full_data) VALUES (?, ?, ?, ?, ?)",
+                (row.get("user_id"), row.get("total_messages"), row.get("health_score"),
+                 row.get("persona_tag"), json.dumps(row.get("full_data") or {}))
+            )
+            self._db.commit()
+        return self.get_analysis(cursor.lastrowid)
+
+    def get_analysis(self, analysis_id: AnalysisId) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM analyses WHERE id = ?", (analysis_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            record = dict(zip([col[0] for col in cursor.description], row))
+        record["full_data"] = json.loads(record["full_data"])
+        return record
+
+    def merge_analysis_fields(
+        self,
+        user_id: str,
+        analysis_id: AnalysisId,
+        fields: Dict[str, Any],
+        health_score: Optional[float] = None,
+        expected_version: Optional[int] = None
+    ) -> int:
+        # json_set with one path per top-level key: replaces whole values like jsonb ||
+        # (json_patch would merge nested objects and treat nulls as deletes)
+        paths = []
+        params: list = []
+        for key, value in fields.items():
+            paths.append("?, json(?)")
+            params += [f'$."{key}"', json.dumps(value)]
+        full_data = f"json_set(full_data, {', '.join(paths)})" if paths else "full_data"
+
+        with self._lock:
+            row = self._db.execute(
+                f"""
+                UPDATE analyses
+                   SET full_data = {full_data},
+                       health_score = coalesce(?, health_score),
+                       version = version + 1
+                 WHERE id = ? AND user_id = ? AND (? IS NULL OR version = ?)
+                RETURNING version
+                """,
+                params + [health_score, analysis_id, user_id, expected_version, expected_version]
+            ).fetchone()
+            if row is not None:
+                result = {"status": "ok", "version": row[0]}
+            else:
+                current = self._db.execute("SELECT version FROM analyses WHERE id = ? AND user_id = ?", (analysis_id, user_id)).fetchone()
+                result = {"status": "not_found"} if current is None else {"status": "conflict", "version": current[0]}
+            self._db.commit()
+        return check_merge_result(result)
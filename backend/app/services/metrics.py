@@ -0,0 +1,237 @@
+import os
+import hmac
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Bearer token Prometheus must send to scrape /metrics; empty = endpoint off
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Seconds; upper bounds of the latency histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Message counts; chats are labelled by the first bound they fit under
+MESSAGE_BUCKETS = ((1_000, "0-1k"), (10_000, "1k-10k"), (100_000, "10k-100k"), (1_000_000, "100k-1M"))
+
+
+def message_bucket(count: Optional[int]) -> str:
+    if count is None:
+        return "unknown"
+    for bound, label in MESSAGE_BUCKETS:
+        if count <= bound:
+            return label
+    return "1M+"
+
+
+INF_LABEL = 'le="+Inf"'
+
+# Kinds of timed block: a pipeline stage, or an external call nested in one
+STAGE = "stage"
+EXTERNAL = "external"
+EXTERNAL_DESC = ';desc="external, within stages"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {total:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values: str):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                # Buckets are stored per interval; the format wants them cumulative
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, INF_LABEL)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "convoq_request_seconds", "Request (or background job) latency",
+    ("endpoint", "method", "status", "messages")
+)
+# kind="external" series (e.g. supabase) are calls made inside the stages;
+# sum only kind="stage" to avoid counting that time twice
+STAGE_SECONDS = Histogram(
+    "convoq_stage_seconds", "Time spent in one pipeline stage (kind=stage) or in external calls nested in stages (kind=external)",
+    ("endpoint", "stage", "kind", "messages")
+)
+EXTERNAL_ERRORS = Counter(
+    "convoq_external_call_errors_total", "Failed calls to external services",
+    ("service", "kind")
+)
+
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS, EXTERNAL_ERRORS)
+
+
+class RequestTimings:
+    """Stage durations of one request; shared by every task the request spawns"""
+
+    def __init__(self, endpoint: str, method: str):
+        self.endpoint = endpoint
+        self.method = method
+        self.status = "500"
+        self.messages: Optional[int] = None
+        self.stages: List[Tuple[str, str, float]] = []  # (name, kind, seconds)
+        self.started = time.perf_counter()
+
+    def server_timing(self) -> str:
+        """Server-Timing header value; repeated stages are summed, external calls are marked as such"""
+        totals: Dict[Tuple[str, str], float] = {}
+        for name, kind, seconds in self.stages:
+            totals[name, kind] = totals.get((name, kind), 0) + seconds
+        totals["total", STAGE] = time.perf_counter() - self.started
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" + (EXTERNAL_DESC if kind == EXTERNAL else "")
+            for (name, kind), seconds in totals.items()
+        )
+
+    def finish(self):
+        bucket = message_bucket(self.messages)
+        REQUEST_SECONDS.observe(time.perf_counter() - self.started, self.endpoint, self.method, self.status, bucket)
+        for name, kind, seconds in self.stages:
+            STAGE_SECONDS.observe(seconds, self.endpoint, name, kind, bucket)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def request_scope(endpoint: str = "unmatched", method: str = "GET") -> Iterator[RequestTimings]:
+    """
+    Collect the stages timed inside this block (and in tasks started from it)
+    and record them in the histograms when it ends.
+    """
+    timings = RequestTimings(endpoint, method)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        timings.finish()
+
+
+async def scoped(endpoint: str, work: Awaitable[T]) -> T:
+    """Await `work` in its own scope; for background jobs that outlive their request"""
+    with request_scope(endpoint, "JOB") as timings:
+        try:
+            result = await work
+        except Exception as e:
+            timings.status = str(getattr(e, "status_code", 500))
+            raise
+        timings.status = "200"
+        return result
+
+
+def set_message_count(count: int):
+    """Label this request's measurements with the size of the chat"""
+    timings = _current.get()
+    if timings is not None:
+        timings.messages = count
+
+
+@contextmanager
+def stage(name: str, kind: str = STAGE):
+    """
+    Time the block as stage `name` of the current request. Calls to other
+    services are timed with kind=EXTERNAL: they run inside the pipeline
+    stages, so their time is already part of those.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings = _current.get()
+        if timings is not None:
+            timings.stages.append((name, kind, seconds))
+        else:
+            STAGE_SECONDS.observe(seconds, "none", name, kind, "unknown")
+
+
+def is_timeout(e: BaseException) -> bool:
+    # asyncio / httpx / groq timeouts share no base class, but all say so in their name
+    return isinstance(e, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(e).__name__
+
+
+def external_error(service: str, kind: str = "error"):
+    EXTERNAL_ERRORS.inc(service, kind)
+
+
+@contextmanager
+def external_call(service: str):
+    """Count an exception escaping the block as a failed call to `service` (re-raised)"""
+    try:
+        yield
+    except Exception as e:
+        external_error(service, "timeout" if is_timeout(e) else "error")
+        raise
+
+
+def scrape_authorized(authorization: str) -> bool:
+    """Whether an Authorization header value carries METRICS_TOKEN (compared in constant time)"""
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
@@ -1,85 +1,267 @@
 import re
-from typing import List
-from datetime import datetime
+import codecs
+from itertools import chain
+from typing import Callable, Dict, List, Iterable, Iterator, BinaryIO, Optional, Sequence, Tuple
+from datetime import date
 from app.models.schema import Message
+from app.models.store import MessageStore, Record
+from app.services.analysis import EPOCH_DATE, parse_timestamp, to_epoch
+
+# Size of each read from an uploaded file when streaming
+CHUNK_SIZE = 64 * 1024
+
+# regex: captures date, hours:minutes, optional seconds, ampm, sender, and message
+# Seconds only count towards format detection; timestamps keep minute precision
+pattern = re.compile(
+    r'^\[?(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2})(?::(\d{2}))?\s*(AM|PM|am|pm)?\]?[\s\-]*([^:]+):\s*(.*)',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# Frontend format strings -> (field order, year digits)
+format_map = {
+    "mm/dd/yyyy": ("mdy", 4),
+    "dd/mm/yyyy": ("dmy", 4),
+    "mm/dd/yy": ("mdy", 2),
+    "dd/mm/yy": ("dmy", 2)
+}
+
+# Header lines read before the date format is decided
+FORMAT_SAMPLE_SIZE = 1000
+
+EPOCH_ORDINAL = EPOCH_DATE.toordinal()
+
+
+class DateFormat:
+    """
+    Timestamp layout of one export: field order and year digits (which decide
+    how dates are read), plus the clock and seconds seen in its headers.
+    """
+
+    def __init__(self, order: str = "mdy", year_digits: int = 2, clock: str = "12h", seconds: bool = False,
+                 confidence: float = 0.0, source: str = "auto"):
+        self.order = order
+        self.year_digits = year_digits
+        self.clock = clock
+        self.seconds = seconds
+        self.confidence = confidence
+        self.source = source
+        # Headers the compiled parser rejected, and of those the ones no format could read
+        self.fallbacks = 0
+        self.unparsed = 0
+
+    @property
+    def name(self) -> str:
+        fields = ["dd", "mm"] if self.order == "dmy" else ["mm", "dd"]
+        return "/".join(fields + ["yyyy" if self.year_digits == 4 else "yy"])
+
+    def describe(self) -> Dict:
+        return {
+            "format": self.name,
+            "clock": self.clock,
+            "seconds": self.seconds,
+            "confidence": round(self.confidence, 2),
+            "source": self.source,
+            "fallback_lines": self.fallbacks,
+            "unparsed_lines": self.unparsed,
+        }
+
+    def compile(self) -> Callable[[str, str, str], Tuple[int, str]]:
+        """
+        (date, "h:mm", "AM" | "PM" | "") -> (epoch, ISO timestamp) in this
+        format, with plain int arithmetic instead of strptime. Raises
+        ValueError for a header that is not a valid time in it. Dates repeat,
+        so each one is read once.
+        """
+        day_first = self.order == "dmy"
+        days: Dict[str, Tuple[int, str]] = {}
+
+        def parse(date_part: str, time_part: str, ampm: str) -> Tuple[int, str]:
+            day = days.get(date_part)
+            if day is None:
+                first, second, year = date_part.split("/")
+                d, m = (first, second) if day_first else (second, first)
+                y = int(year)
+                if len(year) == 2:
+                    # Same pivot as strptime's %y
+                    y += 2000 if y < 69 else 1900
+                dt = date(y, int(m), int(d))
+                day = days[date_part] = ((dt.toordinal() - EPOCH_ORDINAL) * 86400, dt.isoformat())
+
+            hour, minute = time_part.split(":")
+            h, mi = int(hour), int(minute)
+            if ampm:
+                if not 1 <= h <= 12:
+                    raise ValueError(f"Invalid 12h time: {time_part} {ampm}")
+                h = h % 12 + (12 if ampm == "PM" else 0)
+            elif h > 23:
+                raise ValueError(f"Invalid 24h time: {time_part}")
+            if mi > 59:
+                raise ValueError(f"Invalid time: {time_part}")
+
+            return day[0] + h * 3600 + mi * 60, f"{day[1]} {h:02d}:{mi:02d}:00"
+
+        return parse
+
+
+def infer_date_format(samples: Sequence[Tuple[str, str, Optional[str], Optional[str]]], date_format: str = "auto") -> DateFormat:
+    """
+    Work out an export's format from the (date, time, seconds, ampm) of its
+    first headers. A field over 12 can only be the day; when there is none,
+    the field that changes more often between consecutive messages is taken
+    as the day. A format chosen by the user sets order and year.
+    """
+    fmt = DateFormat()
+    day_first_votes = month_first_votes = 0
+    if samples:
+        fields = [date_part.split("/") for date_part, _, _, _ in samples]
+
+        four_digit = sum(len(year) == 4 for _, _, year in fields)
+        fmt.year_digits = 4 if four_digit * 2 > len(fields) else 2
+        year_confidence = max(four_digit, len(fields) - four_digit) / len(fields)
+
+        day_first_votes = sum(int(first) > 12 for first, _, _ in fields)
+        month_first_votes = sum(int(second) > 12 for _, second, _ in fields)
+        if day_first_votes or month_first_votes:
+            fmt.order = "dmy" if day_first_votes > month_first_votes else "mdy"
+            order_confidence = max(day_first_votes, month_first_votes) / (day_first_votes + month_first_votes)
+        else:
+            first_changes = second_changes = 0
+            for (first, second, _), (next_first, next_second, _) in zip(fields, fields[1:]):
+                first_changes += first != next_first
+                second_changes += second != next_second
+            if first_changes == second_changes:
+                # No evidence either way: month first, like the old fallback list
+                fmt.order, order_confidence = "mdy", 0.5
+            else:
+                fmt.order = "dmy" if first_changes > second_changes else "mdy"
+                order_confidence = 0.5 + 0.4 * abs(first_changes - second_changes) / (first_changes + second_changes)
+
+        fmt.clock = "12h" if sum(bool(ampm) for _, _, _, ampm in samples) * 2 > len(samples) else "24h"
+        fmt.seconds = sum(bool(seconds) for _, _, seconds, _ in samples) * 2 > len(samples)
+        fmt.confidence = order_confidence * year_confidence
+
+    if date_format in format_map:
+        fmt.order, fmt.year_digits = format_map[date_format]
+        fmt.source = "user"
+        # The user's choice is kept; confidence shows how far the headers agree with it
+        agree, disagree = (day_first_votes, month_first_votes) if fmt.order == "dmy" else (month_first_votes, day_first_votes)
+        fmt.confidence = agree / (agree + disagree) if disagree else 1.0
+    return fmt
+
 
 def parse_chat(text: str, date_format: str = "auto") -> List[Message]:
     """
     Parse WhatsApp chat export text into structured messages.
     Converts timestamps to ISO 8601 (YYYY-MM-DD HH:MM:SS) to avoid ambiguity.
     """
-    messages = []
-    
-    # regex: captures date, hours:minutes, optional seconds, ampm, sender, and message
-    # The (?: :(\d{2}))? part matches seconds but we'll choose to ignore them
-    pattern = re.compile(
-        r'^\[?(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2})(?::\d{2})?\s*(AM|PM|am|pm)?\]?[\s\-]*([^:]+):\s*(.*)',
-        re.MULTILINE | re.IGNORECASE
-    )
-    
-    lines = text.strip().split('\n')
-    current_message = None
-    
-    # Mapping frontend format strings to python strptime pattern
-    # "mm/dd/yyyy" -> "%m/%d/%Y"
-    # "dd/mm/yyyy" -> "%d/%m/%Y"
-    # "mm/dd/yy"   -> "%m/%d/%y"
-    # "dd/mm/yy"   -> "%d/%m/%y"
-    
-    format_map = {
-        "mm/dd/yyyy": "%m/%d/%Y",
-        "dd/mm/yyyy": "%d/%m/%Y", 
-        "mm/dd/yy": "%m/%d/%y",
-        "dd/mm/yy": "%d/%m/%y"
-    }
-    
-    py_date_fmt = format_map.get(date_format)
+    return list(iter_chat(text.split('\n'), date_format=date_format))
+
+
+def parse_chat_stream(stream: BinaryIO, date_format: str = "auto", chunk_size: int = CHUNK_SIZE) -> Iterator[Message]:
+    """
+    Streaming variant of parse_chat for file-like uploads.
+    Reads the stream in byte chunks, so the raw export is never held in memory
+    as a whole; messages are yielded as soon as they are complete.
+    """
+    return iter_chat(iter_lines(stream, chunk_size=chunk_size), date_format=date_format)
+
+
+def parse_chat_store(stream: BinaryIO, date_format: str = "auto", chunk_size: int = CHUNK_SIZE) -> MessageStore:
+    """
+    Parse a file-like upload straight into a columnar MessageStore.
+    No per-message Message objects are created on the way.
+    The detected date format is left on the store as `date_format`.
+    """
+    detected = []
+    store = MessageStore.from_records(iter_records(iter_lines(stream, chunk_size=chunk_size), date_format=date_format, on_format=detected.append))
+    store.date_format = detected[0].describe() if detected else None
+    return store
+
+
+def iter_lines(stream: BinaryIO, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8") -> Iterator[str]:
+    """Yield text lines from a binary stream, decoding it chunk by chunk."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        # Last piece may be a partial line, carry it into the next chunk
+        pending = lines.pop()
+        yield from lines
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_chat(lines: Iterable[str], date_format: str = "auto") -> Iterator[Message]:
+    """Turn raw export lines into Message objects lazily."""
+    for timestamp, sender, message, epoch in iter_records(lines, date_format=date_format):
+        yield Message(timestamp=timestamp, sender=sender, message=message, epoch=epoch)
 
+
+def iter_records(lines: Iterable[str], date_format: str = "auto", on_format: Optional[Callable[[DateFormat], None]] = None) -> Iterator[Record]:
+    """
+    Turn raw export lines into (timestamp, sender, message, epoch) tuples lazily.
+    The date format is inferred once from the first FORMAT_SAMPLE_SIZE headers
+    (passed to `on_format`), then every header is read by one routine compiled
+    for it. Continuation lines are collected in a buffer and joined once the
+    message is complete, instead of growing the message string in place.
+    """
+    lines = iter(lines)
+    buffered = []
+    samples = []
     for line in lines:
+        buffered.append(line)
+        match = pattern.match(line.strip())
+        if match:
+            samples.append(match.group(1, 2, 3, 4))
+            if len(samples) >= FORMAT_SAMPLE_SIZE:
+                break
+
+    fmt = infer_date_format(samples, date_format)
+    if on_format is not None:
+        on_format(fmt)
+    parse_ts = fmt.compile()
+
+    current = None  # (timestamp, sender, epoch) of the message being collected
+    parts = []
+
+    for line in chain(buffered, lines):
         line = line.strip()
         if not line: continue
-            
+
         match = pattern.match(line)
-        
+
         if match:
-            if current_message:
-                messages.append(current_message)
-            
-            date_part = match.group(1)
-            time_part = match.group(2) # HH:MM
-            ampm = (match.group(3) or "").upper()
-            sender = match.group(4).strip()
-            message_text = match.group(5).strip()
-            
-            # Construct the raw timestamp string from regex
-            raw_ts = f"{date_part} {time_part} {ampm}".strip()
-            
-            # Timestamp normalization to ISO 8601
-            final_ts = raw_ts # Default fallback
-            
-            if py_date_fmt:
+            if current:
+                yield (current[0], current[1], " ".join(parts), current[2])
+
+            date_part, time_part, _, ampm, sender, message_text = match.groups()
+            ampm = (ampm or "").upper()
+
+            try:
+                # Normalized to ISO 8601 here, so downstream stages never parse it again
+                epoch, final_ts = parse_ts(date_part, time_part, ampm)
+            except ValueError:
+                # Not a valid time in the detected format: try the fallback list
+                fmt.fallbacks += 1
+                final_ts = f"{date_part} {time_part} {ampm}".strip()
+                epoch = None
                 try:
-                    # Construct full format string for strptime
-                    # If AM/PM exists, appending %I:%M %p. If not, %H:%M
-                    full_fmt = f"{py_date_fmt} %I:%M %p" if ampm else f"{py_date_fmt} %H:%M"
-                    
-                    dt = datetime.strptime(raw_ts, full_fmt)
-                    final_ts = dt.strftime("%Y-%m-%d %H:%M:%S")
+                    dt = parse_timestamp(final_ts)
+                    epoch, final_ts = to_epoch(dt), dt.strftime("%Y-%m-%d %H:%M:%S")
                 except ValueError:
-                    # Fallback or error - keeping raw might be safer if user selected wrong format
-                    # but downstream analysis expects standard or specific formats.
-                    # We'll leave it as raw so analysis.py can try its fallback list if needed
-                    pass
-
-            current_message = Message(
-                timestamp=final_ts,
-                sender=sender,
-                message=message_text
-            )
-        elif current_message:
-            current_message.message += " " + line
-    
-    if current_message:
-        messages.append(current_message)
-    
-    return messages
\ No newline at end of file
+                    fmt.unparsed += 1
+
+            current = (final_ts, sender.strip(), epoch)
+            parts = [message_text.strip()]
+        elif current:
+            parts.append(line)
+
+    if current:
+        yield (current[0], current[1], " ".join(parts), current[2])
@@ -0,0 +1,144 @@
+import json
+import asyncio
+import inspect
+from array import array
+from typing import Callable, Dict, Tuple
+from app.models.store import MessageStore, pack_sections, unpack_sections
+from app.services.analysis import reply_time_analysis
+from app.services.initiation_analysis import initiation_analysis
+from app.services.sentiment import remember_scores, sentiment_scores_async, timeline_from_scores
+from app.services.semantic import analyze_semantics
+from app.services.toxicity import detect_toxicity
+from app.services.features import message_features
+from app.services.metrics import stage as timed_stage
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, deps: Tuple[str, ...]):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+
+
+# name -> Stage. Each stage is fn(messages, *dependency_outputs), sync or async.
+STAGES: Dict[str, Stage] = {}
+
+
+def stage(name: str, *deps: str):
+    def register(fn):
+        STAGES[name] = Stage(name, fn, deps)
+        return fn
+    return register
+
+
+@stage("sentiment_scores")
+def _sentiment_scores(messages):
+    return sentiment_scores_async(messages)
+
+@stage("timeline", "sentiment_scores")
+def _timeline(messages, scores):
+    return timeline_from_scores(messages, scores)
+
+@stage("reply_times")
+def _reply_times(messages):
+    return reply_time_analysis(messages)
+
+@stage("initiations")
+def _initiations(messages):
+    return initiation_analysis(messages, gap_hours=6)
+
+@stage("base_features", "reply_times", "sentiment_scores", "initiations")
+def _base_features(messages, reply_analysis, scores, initiations):
+    return message_features(messages, reply_analysis, scores, initiations)
+
+@stage("semantic", "sentiment_scores")
+def _semantic(messages, scores):
+    # Fast path: no toxicity verdicts yet; chunks are scored from the stage's output
+    return analyze_semantics(messages, toxicity_data=None, scores=scores)
+
+@stage("toxicity")
+def _toxicity(messages):
+    return detect_toxicity(messages)
+
+
+_SESSION_MAGIC = b"CVS1"
+
+
+class ChatSession:
+    """
+    A cached chat: its MessageStore plus the memoized output of every stage
+    run on it so far. /analyze/fast fills the cheap stages; /analyze/deep
+    reuses them and only computes what is new.
+    """
+
+    def __init__(self, messages: MessageStore):
+        self.messages = messages
+        self.results: Dict[str, object] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, name: str):
+        if name in self.results:
+            return self.results[name]
+
+        # Another request on the same chat may already be computing it
+        inflight = self._inflight.get(name)
+        if inflight is None:
+            inflight = self._inflight[name] = asyncio.ensure_future(self._compute(STAGES[name]))
+        try:
+            result = await asyncio.shield(inflight)
+        finally:
+            if inflight.done():
+                self._inflight.pop(name, None)
+
+        self.results[name] = result
+        return result
+
+    async def run(self, *names: str) -> Dict[str, object]:
+        # Concurrently, so async stages (LLM, HTTP) overlap
+        results = await asyncio.gather(*(self.get(name) for name in names))
+        return dict(zip(names, results))
+
+    async def _compute(self, st: Stage):
+        deps = [await self.get(dep) for dep in st.deps]
+        with timed_stage(st.name):
+            result = st.fn(self.messages, *deps)
+            if inspect.isawaitable(result):
+                result = await result
+        return result
+
+    # ---------------------------
+    # Serialization
+    # ---------------------------
+    def to_bytes(self) -> bytes:
+        """
+        The store's binary form, finished stage results as JSON, and array
+        results (the sentiment scores) as raw buffers.
+        """
+        results = {}
+        arrays = []
+        for name, result in self.results.items():
+            if isinstance(result, array):
+                arrays.append((name, result))
+            else:
+                results[name] = result
+        header = {"results": results, "arrays": [[name, column.typecode] for name, column in arrays]}
+        return pack_sections(_SESSION_MAGIC, [
+            self.messages.to_bytes(),
+            json.dumps(header, separators=(",", ":")).encode("utf-8"),
+            *(column.tobytes() for _, column in arrays),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChatSession":
+        store, header, *buffers = unpack_sections(_SESSION_MAGIC, data)
+        session = cls(MessageStore.from_bytes(store))
+        header = json.loads(bytes(header).decode("utf-8"))
+        session.results.update(header["results"])
+        for (name, typecode), buffer in zip(header["arrays"], buffers):
+            column = array(typecode)
+            column.frombytes(buffer)
+            session.results[name] = column
+
+        if "sentiment_scores" in session.results:
+            remember_scores(session.messages, session.results["sentiment_scores"])
+        return session
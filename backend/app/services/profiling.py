@@ -0,0 +1,151 @@
+import os
+import sys
+import hmac
+import time
+import uuid
+import asyncio
+import cProfile
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Mapping, Optional
+
+# Shared secret a request must send in X-Profile-Secret to be profiled; empty = off
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+# Oldest profiles beyond this many are deleted
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Innermost frames of threads that are only waiting; left out of the samples
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+# One capture at a time: cProfile allows a single active profiler, and the
+# sampler sees every thread anyway
+_capture_lock = threading.Lock()
+
+
+def is_authorized(headers: Mapping[str, str]) -> bool:
+    """Whether the request carries the profiling secret (compared in constant time)"""
+    secret = headers.get("x-profile-secret", "")
+    return bool(PROFILE_SECRET) and hmac.compare_digest(secret.encode(), PROFILE_SECRET.encode())
+
+
+def requested_mode(headers: Mapping[str, str], query: Mapping[str, str]) -> Optional[str]:
+    """'sample' or 'cprofile' when the request asks to be profiled (X-Profile header or ?profile=)"""
+    value = (headers.get("x-profile") or query.get("profile") or "").lower()
+    if value in ("1", "true", "sample"):
+        return "sample"
+    if value == "cprofile":
+        return "cprofile"
+    return None
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread of this process on a timer and
+    counts identical stacks, in the collapsed format flame graph tools read
+    ("thread;outer;...;inner count"). Executor threads (VADER, Supabase) are
+    included; process pool workers are not.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def prune(directory: Path = PROFILE_DIR, keep: int = PROFILE_KEEP):
+    profiles = [*directory.glob("*.collapsed"), *directory.glob("*.pstats")]
+    profiles.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in profiles[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def _write(profile_id: str, directory: Path, profiler: Optional[cProfile.Profile], sampler: Optional[StackSampler]):
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{profile_id}"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(directory / f"{name}.pstats")
+        else:
+            sampler.dump(directory / f"{name}.collapsed")
+        prune(directory)
+    except OSError as e:
+        print(f"Failed to write profile {profile_id}: {e}")
+
+
+@asynccontextmanager
+async def capture(mode: str, directory: Path = PROFILE_DIR) -> AsyncIterator[Optional[str]]:
+    """
+    Profile the block and write <time>-<id>.collapsed (sampling) or .pstats
+    (cProfile, event loop thread only) to `directory`, from a worker thread.
+    Yields the profile id, or None when another capture is already running.
+    Concurrent requests on the same process show up in the profile too.
+    """
+    if not _capture_lock.acquire(blocking=False):
+        yield None
+        return
+
+    profile_id = uuid.uuid4().hex[:12]
+    sampler = profiler = None
+    try:
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler()
+            sampler.start()
+        try:
+            yield profile_id
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            else:
+                # join() waits at most one sampling interval
+                sampler.stop()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _write, profile_id, directory, profiler, sampler)
+    finally:
+        _capture_lock.release()
@@ -0,0 +1,176 @@
+import os
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from supabase import Client
+from app.services.metrics import EXTERNAL, external_call, stage
+
+# Threads dedicated to (blocking) Supabase calls
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))
+# clerk_id -> users.id mappings kept in memory; they never change
+USER_ID_CACHE_SIZE = int(os.getenv("USER_ID_CACHE_SIZE", "10000"))
+
+# analyses.id is a bigint identity column
+AnalysisId = int
+
+# Columns of a history summary; full_data is only fetched per analysis
+SUMMARY_COLUMNS = "id, total_messages, health_score, persona_tag, created_at"
+
+
+class AnalysisNotFound(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version: Optional[int]):
+        super().__init__(f"Analysis was modified concurrently (now at version {current_version})")
+        self.current_version = current_version
+
+
+def check_merge_result(result: Dict) -> int:
+    """New version from a merge_analysis_fields result; raises on not_found / conflict"""
+    status = result.get("status")
+    if status == "not_found":
+        raise AnalysisNotFound("Analysis not found")
+    if status == "conflict":
+        raise VersionConflict(result.get("version"))
+    return result["version"]
+
+
+class AnalysisRepository:
+    """
+    Async data access for users and analyses.
+
+    The supabase client is synchronous, so every call runs on a dedicated
+    thread pool and the event loop keeps serving other requests while one
+    waits on the database. The client's HTTP connection pool is shared by
+    all threads.
+    """
+
+    def __init__(self, client: Client, max_workers: int = DB_THREADS, user_cache_size: int = USER_ID_CACHE_SIZE):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._user_ids = LRUCache(maxsize=user_cache_size)
+
+    async def _run(self, query: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        with stage("supabase", EXTERNAL), external_call("supabase"):
+            return await loop.run_in_executor(self._executor, query)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    # ---------------------------
+    # Users
+    # ---------------------------
+    async def get_user_uuid(self, clerk_id: str) -> str:
+        user_uuid = self._user_ids.get(clerk_id)
+        if user_uuid is None:
+            user_uuid = self._user_ids[clerk_id] = await self._run(lambda: self._get_or_create_user(clerk_id))
+        return user_uuid
+
+    def _get_or_create_user(self, clerk_id: str) -> str:
+        user_query = self.client.table("users").select("id").eq("clerk_id", clerk_id).execute()
+        if not user_query.data:
+            new_user = self.client.table("users").insert({"clerk_id": clerk_id}).execute()
+            return new_user.data[0]["id"]
+        return user_query.data[0]["id"]
+
+    # ---------------------------
+    # Analyses
+    # ---------------------------
+    async def insert_analysis(self, row: Dict) -> Dict:
+        resp = await self._run(lambda: self.client.table("analyses").insert(row).execute())
+        return resp.data[0]
+
+    async def recent_history(self, user_uuid: str, exclude_id: AnalysisId, limit: int = 5) -> List[Dict]:
+        resp = await self._run(lambda: self.client.table("analyses")
+            .select("id, total_messages, health_score, full_data, created_at")
+            .eq("user_id", user_uuid)
+            .neq("id", exclude_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute())
+        return resp.data or []
+
+    async def merge_analysis_fields(
+        self,
+        user_uuid: str,
+        analysis_id: AnalysisId,
+        fields: Dict,
+        health_score: Optional[float] = None,
+        expected_version: Optional[int] = None
+    ) -> int:
+        """
+        Merge `fields` into full_data server-side (sql/merge_analysis_fields.sql),
+        one round trip, without reading the document. Returns the new version.
+        Another user's analysis raises AnalysisNotFound, like a missing one.
+        """
+        resp = await self._run(lambda: self.client.rpc("merge_analysis_fields", {
+            "p_id": analysis_id,
+            "p_user_id": user_uuid,
+            "p_patch": fields,
+            "p_health_score": health_score,
+            "p_expected_version": expected_version
+        }).execute())
+        return check_merge_result(resp.data)
+
+    async def get_trend_stats(self, user_uuid: str) -> Optional[Dict]:
+        resp = await self._run(lambda: self.client.table("user_trend_stats").select("*").eq("user_id", user_uuid).execute())
+        return resp.data[0] if resp.data else None
+
+    async def save_trend_stats(self, user_uuid: str, row: Dict, expected_version: Optional[int] = None) -> int:
+        """
+        Write the user's trend record if it is still at `expected_version`
+        (None: no record yet). Raises VersionConflict when another analysis
+        got there first; returns the new version.
+        """
+        if expected_version is None:
+            # Insert only; an existing row means someone else created it meanwhile
+            resp = await self._run(lambda: self.client.table("user_trend_stats")
+                .upsert({**row, "user_id": user_uuid, "version": 0}, on_conflict="user_id", ignore_duplicates=True)
+                .execute())
+            new_version = 0
+        else:
+            new_version = expected_version + 1
+            resp = await self._run(lambda: self.client.table("user_trend_stats")
+                .update({**row, "version": new_version})
+                .eq("user_id", user_uuid)
+                .eq("version", expected_version)
+                .execute())
+        if not resp.data:
+            raise VersionConflict(None)
+        return new_version
+
+    async def list_history(self, user_uuid: str, limit: int, before: Optional[Tuple[datetime, AnalysisId]] = None) -> List[Dict]:
+        """
+        One page of a user's analyses as summaries (no full_data), newest first.
+        `before` is the (created_at, id) of the last row of the previous page.
+        """
+        def query():
+            q = (self.client.table("analyses")
+                .select(SUMMARY_COLUMNS)
+                .eq("user_id", user_uuid))
+            if before is not None:
+                # Only the parsed values are formatted into the filter
+                created_at, last_id = before[0].isoformat(), str(before[1])
+                # Keyset pagination: strictly after the cursor in (created_at, id) DESC order
+                q = q.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})')
+            return (q.order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(limit)
+                .execute())
+
+        resp = await self._run(query)
+        return resp.data or []
+
+    async def get_analysis(self, user_uuid: str, analysis_id: AnalysisId) -> Optional[Dict]:
+        """One analysis of this user, including full_data"""
+        resp = await self._run(lambda: self.client.table("analyses")
+            .select(f"{SUMMARY_COLUMNS}, full_data")
+            .eq("id", analysis_id)
+            .eq("user_id", user_uuid)
+            .execute())
+        return resp.data[0] if resp.data else None
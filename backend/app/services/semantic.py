@@ -1,30 +1,34 @@
 import os
 import json
-from typing import List, Dict, Optional
-from datetime import timedelta
-from groq import Groq
-from app.models.schema import Message
-from app.services.sentiment import sia
-from app.services.analysis import parse_timestamp
+import asyncio
+from typing import List, Dict, Optional, Sequence
+from app.models.store import MessageStore, MessageRow, NO_EPOCH
+from app.services.sentiment import sentiment_scores, score_text, normalize_text
+from app.services.llm import GROQ_MODEL, count_tokens, get_client, truncate_tokens
+from app.services.metrics import external_call, stage
 
+# Prompt budget (tokens) for one conversation chunk, and for all chunks in one request
+CHUNK_TOKEN_BUDGET = int(os.getenv("SEMANTIC_CHUNK_TOKENS", "800"))
+REQUEST_TOKEN_BUDGET = int(os.getenv("SEMANTIC_REQUEST_TOKENS", "2400"))
 
-GROQ_MODEL = "llama-3.1-8b-instant"
 
-
-def analyze_semantics(
-    messages: List[Message],
+async def analyze_semantics(
+    messages: MessageStore,
     gap_minutes: int = 20,
-    toxicity_data: Optional[Dict] = None
+    toxicity_data: Optional[Dict] = None,
+    scores: Optional[Sequence[float]] = None
 ) -> Dict:
 
     chunks = build_chunks(messages, gap_minutes)
 
-    suspicious_chunks = filter_suspicious_chunks(chunks, toxicity_data)
+    if scores is None:
+        scores = sentiment_scores(messages)
+    suspicious_chunks = filter_suspicious_chunks(chunks, toxicity_data, scores=scores)
 
     if not suspicious_chunks:
         return {"status": "Peaceful", "events": []}
 
-    result = batch_analyze_with_groq(suspicious_chunks)
+    result = await batch_analyze_with_groq(suspicious_chunks)
 
     if toxicity_data and toxicity_data.get("toxic_count", 0) > 0:
         result["status"] = "High Tension"
@@ -35,26 +39,28 @@ def analyze_semantics(
 # ---------------------------
 # Chunking
 # ---------------------------
-def build_chunks(messages: List[Message], gap_minutes: int) -> List[List[Message]]:
+def build_chunks(messages: MessageStore, gap_minutes: int) -> List[List[MessageRow]]:
     chunks = []
     current = []
+    gap_seconds = gap_minutes * 60
+    last_time = NO_EPOCH  # epoch of current[-1]
 
-    for msg in messages:
+    for i, epoch in enumerate(messages.epochs):
         if not current:
-            current.append(msg)
+            current.append(messages[i])
+            last_time = epoch
             continue
 
-        try:
-            curr_time = parse_timestamp(msg.timestamp)
-            prev_time = parse_timestamp(current[-1].timestamp)
+        # Untimed messages can't be placed in a chunk
+        if epoch == NO_EPOCH or last_time == NO_EPOCH:
+            continue
 
-            if (curr_time - prev_time) > timedelta(minutes=gap_minutes):
-                chunks.append(current)
-                current = []
+        if (epoch - last_time) > gap_seconds:
+            chunks.append(current)
+            current = []
 
-            current.append(msg)
-        except Exception:
-            continue
+        current.append(messages[i])
+        last_time = epoch
 
     if current:
         chunks.append(current)
@@ -65,7 +71,7 @@ def build_chunks(messages: List[Message], gap_minutes: int) -> List[List[Message
 # ---------------------------
 # Cheap filter
 # ---------------------------
-def filter_suspicious_chunks(chunks: List[List[Message]], toxicity_data: Optional[Dict]) -> List[Dict]:
+def filter_suspicious_chunks(chunks: List[List[MessageRow]], toxicity_data: Optional[Dict], scores: Optional[Sequence[float]] = None) -> List[Dict]:
 
     trigger_words = {"hate", "wtf", "rude", "stop", "whatever", "bruh"}
     toxic_timestamps = set(m["timestamp"] for m in toxicity_data.get("toxic_messages", [])) if toxicity_data else set()
@@ -79,8 +85,12 @@ def filter_suspicious_chunks(chunks: List[List[Message]], toxicity_data: Optiona
         messages_text = [m.message for m in chunk]
         blob = " ".join(messages_text).lower()
 
-        sentiment_scores = [sia.polarity_scores(m.message)["compound"] for m in chunk]
-        avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
+        # Reuse the chat's per-message scores when we have them
+        if scores is not None:
+            chunk_scores = [scores[m.index] for m in chunk]
+        else:
+            chunk_scores = [score_text(normalize_text(m.message)) for m in chunk]
+        avg_sentiment = sum(chunk_scores) / len(chunk_scores)
 
         trigger_hits = sum(1 for w in trigger_words if w in blob.split())
         contains_known_toxic = any(m.timestamp in toxic_timestamps for m in chunk)
@@ -89,7 +99,10 @@ def filter_suspicious_chunks(chunks: List[List[Message]], toxicity_data: Optiona
             suspicious.append({
                 "msgs": [f"{m.sender}: {m.message}" for m in chunk],
                 "sentiment": avg_sentiment,
-                "timestamp": chunk[0].timestamp
+                "timestamp": chunk[0].timestamp,
+                # Per message, for trimming to the prompt budget
+                "scores": chunk_scores,
+                "toxic": [m.timestamp in toxic_timestamps for m in chunk]
             })
 
     return sorted(suspicious, key=lambda x: x["sentiment"])[:3]
@@ -98,18 +111,16 @@ def filter_suspicious_chunks(chunks: List[List[Message]], toxicity_data: Optiona
 # ---------------------------
 # LLM Judge
 # ---------------------------
-def batch_analyze_with_groq(chunks: List[Dict]) -> Dict:
+async def batch_analyze_with_groq(chunks: List[Dict]) -> Dict:
 
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    client = get_client()
+    if client is None:
         return {"status": "Error", "events": []}
 
-    client = Groq(api_key=api_key)
-
-    payload = json.dumps([
-        {"id": i, "convo": c["msgs"]}
-        for i, c in enumerate(chunks)
-    ])
+    # Each chunk trimmed to its budget, then packed into as few requests as
+    # the request budget allows; the requests run in parallel
+    convos = [fit_chunk(c, CHUNK_TOKEN_BUDGET) for c in chunks]
+    groups = pack_requests(convos, REQUEST_TOKEN_BUDGET)
 
     system_prompt = """
 You are a semantic conflict analyst.
@@ -142,25 +153,105 @@ Output ONLY valid JSON:
 }
 """
 
-    try:
-        completion = client.chat.completions.create(
-            model=GROQ_MODEL,
-            temperature=0.0,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analyze: {payload}"}
-            ],
-        )
+    async def judge(group: List[int]) -> Optional[List[Dict]]:
+        # Ids are positions in `chunks`, so events from every request line up
+        payload = json.dumps([
+            {"id": i, "convo": convos[i]}
+            for i in group
+        ])
+
+        try:
+            with external_call("llm"):
+                completion = await client.chat.completions.create(
+                    model=GROQ_MODEL,
+                    temperature=0.0,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"Analyze: {payload}"}
+                    ],
+                )
+
+            raw = completion.choices[0].message.content
+            return json.loads(raw).get("events", [])
+
+        except Exception as e:
+            print("Groq error:", e)
+            return None
+
+    with stage("semantic_judge"):
+        results = await asyncio.gather(*(judge(group) for group in groups))
+    if all(events is None for events in results):
+        return {"status": "Error", "events": []}
 
-        raw = completion.choices[0].message.content
-        parsed = json.loads(raw)
+    events = [event for group_events in results if group_events for event in group_events]
+    return build_final_events({"events": events}, chunks)
 
-        return build_final_events(parsed, chunks)
 
-    except Exception as e:
-        print("Groq error:", e)
-        return {"status": "Error", "events": []}
+# ---------------------------
+# Prompt budget
+# ---------------------------
+def message_tokens(line: str) -> int:
+    # The line plus its JSON quoting and separator
+    return count_tokens(line) + 2
+
+
+def fit_chunk(chunk: Dict, budget: int) -> List[str]:
+    """
+    The chunk's "sender: message" lines within `budget` tokens. Over budget,
+    keeps the most informative lines (toxic hits first, then the most
+    negative sentiment) in their original order, noting how many were left
+    out; a single line longer than the budget is cut short.
+    """
+    msgs = chunk["msgs"]
+    costs = [message_tokens(line) for line in msgs]
+    if sum(costs) <= budget:
+        return msgs
+
+    scores = chunk.get("scores") or [0.0] * len(msgs)
+    toxic = chunk.get("toxic") or [False] * len(msgs)
+    ranked = sorted(range(len(msgs)), key=lambda i: (not toxic[i], scores[i], i))
+
+    # Each kept line can bring one "omitted" marker before it, plus one at the end
+    marker = message_tokens("[99999 messages omitted]")
+    remaining = budget - marker
+    keep = []
+    for i in ranked:
+        if costs[i] + marker <= remaining:
+            keep.append(i)
+            remaining -= costs[i] + marker
+    if not keep:
+        first = ranked[0]
+        return [truncate_tokens(msgs[first], max(budget - 2 * marker - 2, 1))]
+
+    lines = []
+    last = -1
+    for i in sorted(keep):
+        if i - last > 1:
+            lines.append(f"[{i - last - 1} messages omitted]")
+        lines.append(msgs[i])
+        last = i
+    if last < len(msgs) - 1:
+        lines.append(f"[{len(msgs) - 1 - last} messages omitted]")
+    return lines
+
+
+def pack_requests(convos: List[List[str]], budget: int) -> List[List[int]]:
+    """Split chunk indices into consecutive groups whose payloads fit in `budget` tokens"""
+    groups = []
+    current = []
+    used = 0
+    for i, convo in enumerate(convos):
+        cost = sum(message_tokens(line) for line in convo) + 8  # {"id": i, "convo": [...]}
+        if current and used + cost > budget:
+            groups.append(current)
+            current = []
+            used = 0
+        current.append(i)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
 
 
 # ---------------------------
@@ -1,39 +1,221 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from weakref import WeakKeyDictionary
+from typing import Iterable, Dict, List, Optional, Tuple
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from collections import defaultdict
-from datetime import datetime
+from cachetools import LRUCache
+from app.models.store import MessageStore, NO_EPOCH
 
 sia = SentimentIntensityAnalyzer()
 
+# Scores of short, frequently repeated texts ("ok", "lol", "<Media omitted>"),
+# shared across requests. Long texts are almost always unique, so they are
+# only deduplicated within a chat and never enter this cache.
+COMMON_TEXT_MAX_LEN = 64
+common_scores = LRUCache(maxsize=int(os.getenv("SENTIMENT_CACHE_SIZE", "50000")))
+# Used from executor threads and the event loop; an LRUCache read reorders it
+_common_lock = threading.Lock()
+
+# Per-chat score arrays. Entries disappear together with the MessageStore.
+_chat_scores = WeakKeyDictionary()
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-normalize a message; VADER splits on whitespace, so scores are unchanged."""
+    return " ".join(text.split())
+
+
+def remember_scores(messages, scores: array):
+    """Register already computed scores for a chat (e.g. one restored from a shared cache)"""
+    _chat_scores[messages] = scores
+
+
+def score_text(text: str) -> float:
+    """Compound VADER score of a single (normalized) text, via the shared cache."""
+    with _common_lock:
+        score = common_scores.get(text)
+    if score is None:
+        score = sia.polarity_scores(text)["compound"]
+        if len(text) <= COMMON_TEXT_MAX_LEN:
+            with _common_lock:
+                common_scores[text] = score
+    return score
+
+
+def score_texts(texts: Iterable[str]) -> array:
+    """Compound score for every text, scoring each distinct normalized text once."""
+    seen: Dict[str, float] = {}
+    scores = array("d")
+
+    for text in texts:
+        key = normalize_text(text)
+        score = seen.get(key)
+        if score is None:
+            score = seen[key] = score_text(key)
+        scores.append(score)
+
+    return scores
+
+
+def sentiment_scores(messages: MessageStore) -> array:
+    """
+    Per-message compound scores of a chat as a float array.
+    Computed once per chat and reused by every stage that needs them.
+    """
+    scores = _chat_scores.get(messages)
+    if scores is None:
+        scores = _chat_scores[messages] = score_texts(messages.texts())
+    return scores
+
+
+# ---------------------------
+# Parallel scoring
+# ---------------------------
+# Chats with at least this many messages are scored on a process pool
+PARALLEL_THRESHOLD = int(os.getenv("SENTIMENT_PARALLEL_THRESHOLD", "20000"))
+PARALLEL_WORKERS = int(os.getenv("SENTIMENT_WORKERS", str(os.cpu_count() or 1)))
+# Distinct texts per task sent to a worker
+PARALLEL_SLICE = 5000
+# Workers are never forked from the server: a fork copies locks held by its
+# other threads (Supabase, executors) and can deadlock the child
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_worker_sia: Optional[SentimentIntensityAnalyzer] = None
+
+
+def _init_worker():
+    # Runs once per worker process; the analyzer is reused for every slice
+    global _worker_sia
+    _worker_sia = SentimentIntensityAnalyzer()
+
+
+def _score_slice(texts: List[str]) -> bytes:
+    scores = array("d", (_worker_sia.polarity_scores(t)["compound"] for t in texts))
+    return scores.tobytes()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PARALLEL_WORKERS,
+            initializer=_init_worker,
+            mp_context=multiprocessing.get_context(POOL_START_METHOD)
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _dedupe(messages: MessageStore) -> Tuple[List[str], Dict[str, float], List[str]]:
+    """(normalized text per message, known scores, distinct texts nobody has scored yet)"""
+    keys = [normalize_text(text) for text in messages.texts()]
+    known: Dict[str, float] = {}
+    pending: List[str] = []
+    with _common_lock:
+        for key in keys:
+            if key in known:
+                continue
+            score = common_scores.get(key)
+            if score is None:
+                pending.append(key)
+                score = 0.0  # placeholder until the workers answer
+            known[key] = score
+    return keys, known, pending
+
+
+def _collect(keys: List[str], known: Dict[str, float], slices: List[List[str]], results: List[bytes]) -> array:
+    for chunk, raw in zip(slices, results):
+        chunk_scores = array("d")
+        chunk_scores.frombytes(raw)
+        with _common_lock:
+            for key, score in zip(chunk, chunk_scores):
+                known[key] = score
+                if len(key) <= COMMON_TEXT_MAX_LEN:
+                    common_scores[key] = score
+    return array("d", (known[key] for key in keys))
+
+
+async def _score_parallel(messages: MessageStore) -> array:
+    # Dedupe and the final assembly are per-message loops: both run on a
+    # thread, the loop only dispatches the slices to the process pool
+    loop = asyncio.get_running_loop()
+    keys, known, pending = await loop.run_in_executor(None, _dedupe, messages)
+
+    slices = [pending[i:i + PARALLEL_SLICE] for i in range(0, len(pending), PARALLEL_SLICE)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(get_pool(), _score_slice, chunk) for chunk in slices
+    ))
+
+    return await loop.run_in_executor(None, _collect, keys, known, slices, results)
+
+
+async def sentiment_scores_async(messages: MessageStore) -> array:
+    """
+    sentiment_scores without blocking the event loop.
+    Large chats are split across a process pool, smaller ones are scored on a thread.
+    """
+    scores = _chat_scores.get(messages)
+    if scores is not None:
+        return scores
+
+    if PARALLEL_WORKERS > 1 and len(messages) >= PARALLEL_THRESHOLD:
+        scores = await _score_parallel(messages)
+    else:
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(None, score_texts, messages.texts())
+
+    _chat_scores[messages] = scores
+    return scores
+
+
 def analyze_sentiment(messages):
     sentiment_data = []
 
-    for msg in messages:
-        score = sia.polarity_scores(msg.message)["compound"]
-
+    for i, score in enumerate(sentiment_scores(messages)):
         sentiment_data.append({
-            "timestamp": msg.timestamp,
-            "sender": msg.sender,
+            "timestamp": messages.timestamp(i),
+            "epoch": messages.epoch(i),
+            "sender": messages.sender(i),
             "sentiment": score
         })
 
     return sentiment_data
 
 
-from app.services.analysis import parse_timestamp
+from app.services.analysis import epoch_date
 
 def sentiment_timeline(sentiment_data):
+    return daily_timeline((item.get("epoch"), item["sentiment"]) for item in sentiment_data)
+
+
+def timeline_from_scores(messages: MessageStore, scores) -> list:
+    """sentiment_timeline straight from the epoch column and a score array"""
+    return daily_timeline(
+        (None if epoch == NO_EPOCH else epoch, score) for epoch, score in zip(messages.epochs, scores)
+    )
+
+
+def daily_timeline(points):
     daily = defaultdict(list)
 
-    for item in sentiment_data:
-        try:
-            timestamp = item["timestamp"]
-            date = parse_timestamp(timestamp).date()
-            
-            if date:
-                daily[date].append(item["sentiment"])
-        except:
+    for epoch, sentiment in points:
+        if epoch is None:
             continue
 
+        daily[epoch_date(epoch)].append(sentiment)
+
     timeline = []
     for date, scores in daily.items():
         timeline.append({
@@ -42,4 +224,4 @@ def sentiment_timeline(sentiment_data):
         })
 
     timeline.sort(key=lambda x: x["date"])
-    return timeline
\ No newline at end of file
+    return timeline
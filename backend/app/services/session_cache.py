@@ -0,0 +1,294 @@
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from app.services import codec
+from app.services.pipeline import ChatSession
+
+# "memory" (per process) or "file" (shared by every worker on the machine)
+SESSION_CACHE_BACKEND = os.getenv("SESSION_CACHE_BACKEND", "memory").lower()
+# Entries expire this long after their last use
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "600"))
+# Budget for the stored (compressed) bytes of all entries
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Directory of the file backend; /dev/shm keeps it in shared memory where available
+SESSION_CACHE_DIR = os.getenv(
+    "SESSION_CACHE_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "convoq-sessions")
+)
+
+
+def entry_id(key: str) -> str:
+    # Keys authorize /analyze/deep, so they are never exposed or used as file names
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class SessionCache(ABC):
+    """
+    cache_key -> ChatSession, bounded by total stored bytes.
+
+    Sessions are stored serialized and compressed (see services/codec.py)
+    and only decompressed when requested. Backends implement _load / _store
+    on the encoded blobs; counters and per-entry metrics are kept here.
+    Async code uses aget / aput / acontains, which (de)compress and do the
+    backend's I/O in a worker thread.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # entry id -> milliseconds of the last decompress + load, in this process
+        self._decode_ms = LRUCache(maxsize=1024)
+        # get/put run on executor threads; guards the counters and _decode_ms
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ChatSession]:
+        blob = self._load(key)
+        if blob is None:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+
+        start = time.perf_counter()
+        session = ChatSession.from_bytes(codec.decode(blob))
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        with self._stats_lock:
+            self.hits += 1
+            self._decode_ms[entry_id(key)] = elapsed_ms
+        return session
+
+    def put(self, key: str, session: ChatSession):
+        self._store(key, codec.encode(session.to_bytes()))
+
+    async def aget(self, key: str) -> Optional[ChatSession]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, key)
+
+    async def aput(self, key: str, session: ChatSession):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.put, key, session)
+
+    async def acontains(self, key: str) -> bool:
+        # A stat() for the file backend
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.__contains__, key)
+
+    @abstractmethod
+    def __contains__(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _load(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def _store(self, key: str, blob: bytes):
+        ...
+
+    @abstractmethod
+    def _headers(self) -> Dict[str, Tuple[bytes, int]]:
+        """entry id -> (the first codec.HEADER_SIZE bytes of its blob, stored size)"""
+
+    def entry_stats(self) -> List[Dict]:
+        """Per entry: codec, raw and stored size, compression ratio, last decompression time here"""
+        entries = []
+        with self._stats_lock:
+            decode_ms = dict(self._decode_ms)
+        for eid, (header, stored) in self._headers().items():
+            try:
+                entry_codec, raw_size = codec.read_header(header)
+            except ValueError:
+                continue
+            entries.append({
+                "id": eid[:12],
+                "codec": entry_codec.name,
+                "raw_bytes": raw_size,
+                "stored_bytes": stored,
+                "ratio": round(raw_size / stored, 2) if stored else None,
+                "decompress_ms": decode_ms.get(eid),
+            })
+        return entries
+
+    def stats(self) -> Dict:
+        entries = self.entry_stats()
+        raw = sum(e["raw_bytes"] for e in entries)
+        stored = sum(e["stored_bytes"] for e in entries)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+            "codec": codec.default_codec().name,
+            "entries": len(entries),
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "ratio": round(raw / stored, 2) if stored else None,
+            "per_entry": entries,
+        }
+
+
+class MemorySessionCache(SessionCache):
+    """Compressed sessions in this process, LRU within the byte budget"""
+
+    def __init__(self, max_bytes: int = SESSION_CACHE_MAX_BYTES, ttl: int = SESSION_CACHE_TTL):
+        super().__init__(max_bytes, ttl)
+        self._entries: "OrderedDict[str, list]" = OrderedDict()  # key -> [blob, last_used]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[1] <= self.ttl
+
+    def _load(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                return None
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key: str, blob: bytes):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = [blob, time.monotonic()]
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        blob, _ = self._entries.pop(key)
+        self._bytes -= len(blob)
+
+    def _headers(self) -> Dict[str, Tuple[bytes, int]]:
+        with self._lock:
+            return {
+                entry_id(key): (blob[:codec.HEADER_SIZE], len(blob))
+                for key, (blob, _) in self._entries.items()
+            }
+
+
+class FileSessionCache(SessionCache):
+    """
+    Compressed sessions as files in one directory, so any worker on the
+    machine can pick up a chat another one parsed; the byte budget covers
+    the whole directory. Writes are atomic (write + rename); a file's mtime
+    is its last use, for TTL and LRU. Counters are per process. Reads,
+    writes and the eviction scan all block, so async callers go through
+    aget / aput / acontains.
+    """
+
+    SUFFIX = ".session"
+
+    def __init__(self, directory: str = SESSION_CACHE_DIR, max_bytes: int = SESSION_CACHE_MAX_BYTES, ttl: int = SESSION_CACHE_TTL):
+        super().__init__(max_bytes, ttl)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, entry_id(key) + self.SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            return time.time() - os.stat(self._path(key)).st_mtime <= self.ttl
+        except FileNotFoundError:
+            return False
+
+    def _load(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another worker meanwhile
+            return None
+        return blob
+
+    def _store(self, key: str, blob: bytes):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        now = time.time()
+        live = []
+        for mtime, size, path in self._entries():
+            if now - mtime > self.ttl:
+                self._unlink(path)
+            else:
+                live.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in live)
+        # Oldest first, always keeping the newest entry
+        for mtime, size, path in sorted(live)[:-1]:
+            if total <= self.max_bytes:
+                break
+            if self._unlink(path):
+                with self._stats_lock:
+                    self.evictions += 1
+            total -= size
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _headers(self) -> Dict[str, Tuple[bytes, int]]:
+        headers = {}
+        for _, size, path in self._entries():
+            try:
+                with open(path, "rb") as f:
+                    header = f.read(codec.HEADER_SIZE)
+            except FileNotFoundError:
+                continue
+            headers[os.path.basename(path)[:-len(self.SUFFIX)]] = (header, size)
+        return headers
+
+
+BACKENDS = {
+    "memory": MemorySessionCache,
+    "file": FileSessionCache,
+}
+
+
+def make_session_cache(name: str = SESSION_CACHE_BACKEND) -> SessionCache:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown session cache backend: {name}")
+    return BACKENDS[name]()
@@ -1,57 +1,172 @@
 import os
-import requests
-from typing import List
-from app.models.schema import Message
-from dotenv import load_dotenv
-
-load_dotenv()
-HF_TOKEN = os.getenv("HF_TOKEN")
-API_URL = "https://api-inference.huggingface.co/models/unitary/toxic-bert"
-headers = {"Authorization": f"Bearer {HF_TOKEN}"}
-
-# Local backup for common hostile words used in the chat
-RED_FLAG_WORDS = {"pathetic", "idiot", "loser", "shut up", "annoying", "suffocating", "hate", "toxic", "stfu"}
-
-def query_toxicity_api(text: str):
-    try:
-        response = requests.post(API_URL, headers=headers, json={"inputs": text}, timeout=5)
-        return response.json()
-    except:
-        return {"error": "connection failed"}
-
-def detect_toxicity(messages: List[Message]):
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from app.models.store import MessageStore
+from app.services.toxicity_client import ToxicityClient
+from app.services.toxicity_lexicon import LexiconToxicityEngine
+from app.services.verdict_cache import VerdictCache, verdict_key
+
+# "hybrid" (lexicon + model on every message), "local" (lexicon only, offline),
+# "remote" (model only) or "second_opinion" (model re-checks lexicon hits)
+TOXICITY_BACKEND = os.getenv("TOXICITY_BACKEND", "hybrid")
+
+# Local lexicon scores at or above this flag a message
+LOCAL_THRESHOLD = 0.5
+
+# Shared, pooled client for the remote toxic-bert model
+client = ToxicityClient()
+# Verdicts by normalized text, reused within a chat and across uploads
+verdict_cache = VerdictCache()
+# Compiled lexicon automaton for local scoring
+lexicon_engine = LexiconToxicityEngine()
+
+# A verdict is None (clean) or {"scores": {label: score}, "severity": "high" | "moderate"}
+Verdict = Optional[Dict]
+
+
+async def score_remote(texts):
+    """
+    Remote model scores for every text. Each distinct normalized text is
+    looked up in the verdict cache and, if missing, sent to the API once.
+    """
+    keys = [verdict_key(text) for text in texts]
+    unique = {}
+    for key, text in zip(keys, texts):
+        unique.setdefault(key, text)
+    verdict_cache.deduplicated += len(keys) - len(unique)
+
+    verdicts = await verdict_cache.aget_many(unique)
+    missing = [key for key in unique if key not in verdicts]
+
+    fresh = await client.score([unique[key] for key in missing])
+    fresh = dict(zip(missing, fresh))
+    # Failed batches come back empty; don't remember those
+    await verdict_cache.aput_many({key: scores for key, scores in fresh.items() if scores})
+    verdicts.update(fresh)
+
+    return [verdicts[key] for key in keys]
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+class ToxicityBackend(ABC):
+    """Classifies a column of texts, returning one Verdict per text."""
+    name = "base"
+
+    @abstractmethod
+    async def classify(self, texts: List[str]) -> List[Verdict]:
+        ...
+
+
+class LocalToxicityBackend(ToxicityBackend):
+    name = "local"
+
+    def __init__(self, engine: LexiconToxicityEngine = lexicon_engine):
+        self.engine = engine
+
+    async def classify(self, texts):
+        return [self.verdict(scores) for scores in self.engine.score_column(texts)]
+
+    @staticmethod
+    def verdict(scores: Dict[str, float]) -> Verdict:
+        if not scores or max(scores.values()) < LOCAL_THRESHOLD:
+            return None
+        return {"scores": scores, "severity": "high" if max(scores.values()) >= 0.7 else "moderate"}
+
+
+class RemoteToxicityBackend(ToxicityBackend):
+    name = "remote"
+
+    async def classify(self, texts):
+        return [self.verdict(scores) for scores in await score_remote(texts)]
+
+    @staticmethod
+    def verdict(scores: Dict[str, float]) -> Verdict:
+        if not any(score > 0.5 for score in scores.values()):
+            return None
+        return {"scores": scores, "severity": "high" if scores.get('toxic', 0) > 0.7 else "moderate"}
+
+
+class HybridToxicityBackend(ToxicityBackend):
+    """Lexicon and model on every text; either one can flag a message."""
+    name = "hybrid"
+
+    def __init__(self, engine: LexiconToxicityEngine = lexicon_engine):
+        self.engine = engine
+
+    async def classify(self, texts):
+        local_scores = self.engine.score_column(texts)
+        remote_scores = await score_remote(texts)
+
+        verdicts = []
+        for local, remote in zip(local_scores, remote_scores):
+            local_toxic = LocalToxicityBackend.verdict(local) is not None
+            api_toxic = any(score > 0.5 for score in remote.values())
+
+            if local_toxic or api_toxic:
+                verdicts.append({
+                    "scores": remote or local,
+                    "severity": "high" if (remote.get('toxic', 0) > 0.7 or local_toxic) else "moderate"
+                })
+            else:
+                verdicts.append(None)
+        return verdicts
+
+
+class SecondOpinionToxicityBackend(ToxicityBackend):
+    """Lexicon first; only its hits go to the model, whose answer wins when available."""
+    name = "second_opinion"
+
+    def __init__(self, engine: LexiconToxicityEngine = lexicon_engine):
+        self.local = LocalToxicityBackend(engine)
+
+    async def classify(self, texts):
+        verdicts = await self.local.classify(texts)
+        flagged = [i for i, verdict in enumerate(verdicts) if verdict is not None]
+
+        remote_scores = await score_remote([texts[i] for i in flagged])
+        for i, scores in zip(flagged, remote_scores):
+            if scores:
+                verdicts[i] = RemoteToxicityBackend.verdict(scores)
+        return verdicts
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (LocalToxicityBackend, RemoteToxicityBackend, HybridToxicityBackend, SecondOpinionToxicityBackend)
+}
+
+
+def get_backend(name: str = None) -> ToxicityBackend:
+    name = name or TOXICITY_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown toxicity backend: {name}")
+    return BACKENDS[name]()
+
+
+async def detect_toxicity(messages: MessageStore, backend: Optional[ToxicityBackend] = None):
+    backend = backend or get_backend()
     toxic_messages = []
-    
-    for msg in messages:
-        text_lower = msg.message.lower()
-        
-        # FIX: Lowered limit from 5 to 2 to catch "k", "idk", "loser"
-        if len(text_lower) < 2:
-            continue
-            
-        # 1. Local Keyword Check (Instant fallback)
-        local_toxic = any(word in text_lower for word in RED_FLAG_WORDS)
-        
-        # 2. API Check
-        api_results = query_toxicity_api(msg.message)
-        scores = {}
-        api_toxic = False
-
-        if isinstance(api_results, list) and len(api_results) > 0:
-            scores = {item['label']: item['score'] for item in api_results[0]}
-            api_toxic = any(score > 0.5 for score in scores.values())
-
-        # Combine results
-        if local_toxic or api_toxic:
+
+    # FIX: Lowered limit from 5 to 2 to catch "k", "idk", "loser"
+    candidates = [i for i, length in enumerate(messages.lengths) if length >= 2]
+    texts = [messages.message(i) for i in candidates]
+
+    verdicts = await backend.classify(texts)
+
+    for i, verdict in zip(candidates, verdicts):
+        if verdict is not None:
             toxic_messages.append({
-                "timestamp": msg.timestamp,
-                "sender": msg.sender,
-                "scores": scores,
-                "severity": "high" if (scores.get('toxic', 0) > 0.7 or local_toxic) else "moderate"
+                "timestamp": messages.timestamp(i),
+                "sender": messages.sender(i),
+                "scores": verdict["scores"],
+                "severity": verdict["severity"]
             })
-    
+
     return {
         "toxic_count": len(toxic_messages),
         "toxic_messages": toxic_messages,
-        "toxicity_rate": round(len(toxic_messages) / len(messages) * 100, 2) if messages else 0
-    }
\ No newline at end of file
+        "toxicity_rate": round(len(toxic_messages) / len(messages) * 100, 2) if messages else 0,
+        "backend": backend.name
+    }
@@ -0,0 +1,137 @@
+import os
+import asyncio
+from typing import List, Dict, Optional
+import httpx
+from dotenv import load_dotenv
+from app.services.metrics import external_call, external_error
+
+load_dotenv()
+HF_TOKEN = os.getenv("HF_TOKEN")
+# Point this at a local stand-in server for tests / offline runs
+API_URL = os.getenv("TOXICITY_API_URL", "https://api-inference.huggingface.co/models/unitary/toxic-bert")
+
+BATCH_SIZE = int(os.getenv("TOXICITY_BATCH_SIZE", "32"))
+CONCURRENCY = int(os.getenv("TOXICITY_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("TOXICITY_MAX_RETRIES", "4"))
+
+# Status codes worth retrying: throttled, or model still loading
+RETRY_STATUSES = {429, 503}
+
+
+class ToxicityClient:
+    """
+    Batched client for the toxic-bert inference endpoint.
+
+    Texts are sent BATCH_SIZE per request over one pooled HTTP connection set,
+    with at most CONCURRENCY batches in flight. Throttled batches are retried
+    with exponential backoff; batches that still fail score as {} so the
+    caller can fall back to local signals.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        token: Optional[str] = HF_TOKEN,
+        batch_size: int = BATCH_SIZE,
+        concurrency: int = CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self._timeout = timeout
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self._headers,
+                timeout=self._timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def score(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Label -> score dict for every text, in input order"""
+        if not texts:
+            return []
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        async def run(batch):
+            async with semaphore:
+                return await self._score_batch(batch)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [scores for batch_scores in results for scores in batch_scores]
+
+    async def _score_batch(self, batch: List[str]) -> List[Dict[str, float]]:
+        client = self._get_client()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with external_call("toxicity"):
+                    response = await client.post(
+                        self.api_url,
+                        json={"inputs": batch, "options": {"wait_for_model": True}},
+                    )
+            except httpx.TransportError as e:
+                print(f"Toxicity API transport error: {e}")
+                response = None
+
+            if response is not None and response.is_error:
+                external_error("toxicity")
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                if response.is_error:
+                    print(f"Toxicity API error {response.status_code}")
+                    break
+                try:
+                    return parse_batch_response(response.json(), len(batch))
+                except ValueError:
+                    print("Toxicity API returned invalid JSON")
+                    break
+
+            if attempt < self.max_retries:
+                delay = self.backoff * (2 ** attempt)
+                retry_after = response.headers.get("retry-after") if response is not None else None
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                await asyncio.sleep(delay)
+
+        return [{} for _ in batch]
+
+
+def parse_batch_response(data, expected: int) -> List[Dict[str, float]]:
+    """
+    Normalize the endpoint's reply to one {label: score} dict per input.
+    The API returns a list (one per input) of lists of {label, score};
+    a single-label reply may come back as a bare dict.
+    """
+    if not isinstance(data, list) or len(data) != expected:
+        return [{} for _ in range(expected)]
+
+    parsed = []
+    for item in data:
+        if isinstance(item, dict):
+            item = [item]
+        try:
+            parsed.append({entry["label"]: entry["score"] for entry in item})
+        except (TypeError, KeyError):
+            parsed.append({})
+    return parsed
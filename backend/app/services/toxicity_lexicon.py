@@ -0,0 +1,93 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Sequence
+
+LABELS = ("toxic", "insult", "threat")
+
+# term -> label weights (0..1). Terms are matched case-insensitively on word
+# boundaries; spaces inside a phrase match any run of spaces/tabs.
+LEXICON: Dict[str, Dict[str, float]] = {
+    # insults
+    "pathetic": {"toxic": 0.75, "insult": 0.8},
+    "idiot": {"toxic": 0.8, "insult": 0.9},
+    "idiots": {"toxic": 0.8, "insult": 0.9},
+    "stupid": {"toxic": 0.7, "insult": 0.75},
+    "loser": {"toxic": 0.75, "insult": 0.85},
+    "dumb": {"toxic": 0.6, "insult": 0.65},
+    "moron": {"toxic": 0.8, "insult": 0.9},
+    "worthless": {"toxic": 0.8, "insult": 0.85},
+    "useless": {"toxic": 0.55, "insult": 0.6},
+    "clown": {"toxic": 0.5, "insult": 0.55},
+    # hostility
+    "shut up": {"toxic": 0.75, "insult": 0.4},
+    "stfu": {"toxic": 0.85, "insult": 0.5},
+    "annoying": {"toxic": 0.7, "insult": 0.5},
+    "suffocating": {"toxic": 0.7},
+    "hate": {"toxic": 0.75},
+    "hate you": {"toxic": 0.85, "insult": 0.5},
+    "hated": {"toxic": 0.7},
+    "hates": {"toxic": 0.7},
+    "toxic": {"toxic": 0.7},
+    "get lost": {"toxic": 0.6, "insult": 0.4},
+    "leave me alone": {"toxic": 0.5},
+    "get off my back": {"toxic": 0.6},
+    "wtf": {"toxic": 0.5},
+    # threats
+    "kill you": {"toxic": 0.9, "threat": 0.95},
+    "hurt you": {"toxic": 0.8, "threat": 0.85},
+    "watch your back": {"toxic": 0.7, "threat": 0.8},
+    "you'll regret": {"toxic": 0.6, "threat": 0.7},
+    "or else": {"toxic": 0.4, "threat": 0.5},
+}
+
+
+class LexiconToxicityEngine:
+    """
+    Local, CPU-only toxicity scorer.
+
+    The whole lexicon is compiled into one alternation regex. A column of
+    messages is joined into a single newline-separated blob and scanned in one
+    pass; each match is mapped back to its message by offset. Weights of all
+    hits in a message are combined per label with a noisy-OR, so scores are
+    graded (two mild hits score higher than one) and stay within 0..1.
+    """
+
+    def __init__(self, lexicon: Dict[str, Dict[str, float]] = LEXICON):
+        self.lexicon = {term.lower(): weights for term, weights in lexicon.items()}
+        # Longest terms first so "hate you" wins over "hate"
+        alternatives = sorted(self.lexicon, key=len, reverse=True)
+        self.pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(t).replace(r"\ ", r"[^\S\n]+") for t in alternatives) + r")\b",
+            re.IGNORECASE,
+        )
+
+    def _weights(self, match: str) -> Dict[str, float]:
+        return self.lexicon[" ".join(match.lower().split())]
+
+    def score_text(self, text: str) -> Dict[str, float]:
+        return self.score_column([text])[0]
+
+    def score_column(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        """Label scores for every text; texts without hits score {}"""
+        # Newlines separate messages (and are never part of a match)
+        texts = [t.replace("\n", " ") for t in texts]
+        blob = "\n".join(texts)
+
+        starts = []
+        pos = 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text) + 1
+
+        # Probability that a label is *absent*, per message with hits
+        clean: Dict[int, Dict[str, float]] = {}
+        for match in self.pattern.finditer(blob):
+            index = bisect_right(starts, match.start()) - 1
+            absent = clean.setdefault(index, {label: 1.0 for label in LABELS})
+            for label, weight in self._weights(match.group()).items():
+                absent[label] *= 1.0 - weight
+
+        results: List[Dict[str, float]] = [{} for _ in texts]
+        for index, absent in clean.items():
+            results[index] = {label: round(1.0 - p, 4) for label, p in absent.items()}
+        return results
@@ -1,4 +1,21 @@
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional, Union
+
+# Completed analyses kept per user for the slope, and the EWMA smoothing factor
+TREND_WINDOW = int(os.getenv("TREND_WINDOW", "10"))
+TREND_EWMA_ALPHA = float(os.getenv("TREND_EWMA_ALPHA", "0.5"))
+
+
+def current_snapshot_of(current_stats: Dict[str, Any]) -> Dict[str, Any]:
+    current_features = current_stats.get("features", {})
+    return {
+        "health_score": current_stats.get("health_score", 0),
+        "toxicity": current_stats.get("toxicity", {}).get("toxicity_rate", 0),
+        "reply_balance": current_features.get("reply_time_balance", 0.5),
+        "initiation_balance": current_features.get("initiation_balance", 0.5),
+        "sentiment_stability": current_features.get("sentiment_stability", 0.5)
+    }
+
 
 def evaluate_trends(current_stats: Dict[str, Any], history: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
@@ -44,14 +61,7 @@ def evaluate_trends(current_stats: Dict[str, Any], history: List[Dict[str, Any]]
     past_snapshots.reverse()
     
     # Add current
-    current_features = current_stats.get("features", {})
-    current_snapshot = {
-        "health_score": current_stats.get("health_score", 0),
-        "toxicity": current_stats.get("toxicity", {}).get("toxicity_rate", 0),
-        "reply_balance": current_features.get("reply_time_balance", 0.5),
-        "initiation_balance": current_features.get("initiation_balance", 0.5),
-        "sentiment_stability": current_features.get("sentiment_stability", 0.5)
-    }
+    current_snapshot = current_snapshot_of(current_stats)
     
     all_snapshots = past_snapshots + [current_snapshot]
     
@@ -77,6 +87,11 @@ def evaluate_trends(current_stats: Dict[str, Any], history: List[Dict[str, Any]]
     health_delta = current_snapshot["health_score"] - avg_prev_health
     toxicity_delta = current_snapshot["toxicity"] - avg_prev_tox
     
+    return decide(current_snapshot, health_delta, toxicity_delta)
+
+
+def decide(current_snapshot: Dict[str, Any], health_delta: float, toxicity_delta: float, extra_metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Decision signal from the current snapshot and its change against the recent past"""
     reasons = []
     
     # 3. Decision Logic
@@ -138,6 +153,174 @@ def evaluate_trends(current_stats: Dict[str, Any], history: List[Dict[str, Any]]
         "reasons": reasons,
         "metrics_delta": {
             "health_change": round(health_delta, 1),
-            "toxicity_change": round(toxicity_delta, 1)
+            "toxicity_change": round(toxicity_delta, 1),
+            **(extra_metrics or {})
         }
     }
+
+
+# ---------------------------
+# Incremental per-user stats
+# ---------------------------
+def least_squares_slope(values: List[float]) -> float:
+    """Slope of the best-fit line through values at x = 0, 1, 2, ..."""
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    var = n * (n * n - 1) / 12  # sum of (x - mean_x)^2 for x = 0..n-1
+    return cov / var
+
+
+class TrendStats:
+    """
+    One user's rolling trend record (a user_trend_stats row), updated once per
+    completed analysis: a count, EWMAs of health and toxicity, and the last
+    `window` (analysis_id, health, toxicity) points for the slope.
+    `prior` is the record as it was before the last update, so re-running the
+    deep analysis of that same chat replaces its point instead of counting it twice.
+    """
+
+    def __init__(
+        self,
+        count: int = 0,
+        health_ewma: float = 0.0,
+        toxicity_ewma: float = 0.0,
+        window: Optional[List[List]] = None,
+        last_analysis_id: Optional[str] = None,
+        prior: Optional[Dict[str, Any]] = None
+    ):
+        self.count = count
+        self.health_ewma = health_ewma
+        self.toxicity_ewma = toxicity_ewma
+        self.window = window or []
+        self.last_analysis_id = last_analysis_id
+        self.prior = prior
+
+    @classmethod
+    def from_row(cls, row: Optional[Dict[str, Any]]) -> "TrendStats":
+        if not row:
+            return cls()
+        return cls(
+            count=row.get("count", 0),
+            health_ewma=row.get("health_ewma", 0.0),
+            toxicity_ewma=row.get("toxicity_ewma", 0.0),
+            window=row.get("window"),
+            last_analysis_id=row.get("last_analysis_id"),
+            prior=row.get("prior")
+        )
+
+    @classmethod
+    def from_history(cls, history: List[Dict[str, Any]]) -> "TrendStats":
+        """Seed a record from analyses rows (newest first, with full_data), for users who predate it"""
+        stats = cls()
+        for item in reversed(history):
+            data = item.get("full_data", {}) or {}
+            if data.get("analysis_status") == "pending_deep":
+                continue
+            stats = stats.updated(item["id"], {
+                "health_score": item.get("health_score", 0),
+                "toxicity": data.get("toxicity", {}).get("toxicity_rate", 0)
+            })
+        return stats
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "health_ewma": self.health_ewma,
+            "toxicity_ewma": self.toxicity_ewma,
+            "window": self.window,
+            "last_analysis_id": self.last_analysis_id,
+            "prior": self.prior
+        }
+
+    def excluding(self, analysis_id: Union[str, int], alpha: float = TREND_EWMA_ALPHA) -> "TrendStats":
+        """
+        The record without `analysis_id`'s contribution, to compare that chat
+        with the others. The last update is undone exactly from `prior`. An
+        older point still in the window is dropped from it and its weight
+        taken out of the EWMAs (the remaining weights scaled back up to 1).
+        Such a record is only for comparison: it cannot be undone again.
+        """
+        analysis_id = str(analysis_id)
+        if self.last_analysis_id is not None and self.last_analysis_id == analysis_id:
+            return TrendStats.from_row(self.prior)
+
+        ids = [point[0] for point in self.window]
+        if analysis_id not in ids:
+            return self
+        if self.count <= 1:
+            return TrendStats()
+
+        index = ids.index(analysis_id)
+        later = len(self.window) - 1 - index
+        # The very first point seeded the EWMAs, so it never got the alpha factor
+        seeded = index == 0 and self.count == len(self.window)
+        weight = (1 - alpha) ** later * (1 if seeded else alpha)
+        _, health, toxicity = self.window[index]
+        return TrendStats(
+            count=self.count - 1,
+            health_ewma=(self.health_ewma - weight * health) / (1 - weight),
+            toxicity_ewma=(self.toxicity_ewma - weight * toxicity) / (1 - weight),
+            window=self.window[:index] + self.window[index + 1:]
+        )
+
+    def updated(self, analysis_id: Union[str, int], snapshot: Dict[str, Any], window: int = TREND_WINDOW, alpha: float = TREND_EWMA_ALPHA) -> "TrendStats":
+        analysis_id = str(analysis_id)
+        if self.last_analysis_id is not None and self.last_analysis_id == analysis_id:
+            # Re-run of the last analysis: replace its point
+            base = TrendStats.from_row(self.prior)
+        elif any(point[0] == analysis_id for point in self.window):
+            # An older analysis re-run after newer ones: it is already counted
+            return self
+        else:
+            base = self
+
+        health, toxicity = snapshot["health_score"], snapshot["toxicity"]
+        if base.count == 0:
+            health_ewma, toxicity_ewma = health, toxicity
+        else:
+            health_ewma = alpha * health + (1 - alpha) * base.health_ewma
+            toxicity_ewma = alpha * toxicity + (1 - alpha) * base.toxicity_ewma
+
+        prior = base.to_row()
+        prior["prior"] = None  # Only one level of undo is needed
+        return TrendStats(
+            count=base.count + 1,
+            health_ewma=health_ewma,
+            toxicity_ewma=toxicity_ewma,
+            window=(base.window + [[analysis_id, health, toxicity]])[-window:],
+            last_analysis_id=analysis_id,
+            prior=prior
+        )
+
+
+def evaluate_trends_from_stats(current_stats: Dict[str, Any], stats: TrendStats) -> Dict[str, Any]:
+    """
+    Same decision signal as evaluate_trends, from the user's rolling record
+    (excluding the current analysis) instead of a history scan. The current
+    chat is compared with the EWMA of the earlier ones; the slopes run over
+    the window plus the current chat.
+    """
+    if stats.count == 0:
+        return {
+            "decision": "Not Enough Data",
+            "decision_color": "gray",
+            "reasons": ["Upload more chats over time to track trends."],
+            "metrics_delta": {}
+        }
+
+    current_snapshot = current_snapshot_of(current_stats)
+    health_delta = current_snapshot["health_score"] - stats.health_ewma
+    toxicity_delta = current_snapshot["toxicity"] - stats.toxicity_ewma
+
+    health_points = [point[1] for point in stats.window] + [current_snapshot["health_score"]]
+    toxicity_points = [point[2] for point in stats.window] + [current_snapshot["toxicity"]]
+
+    return decide(current_snapshot, health_delta, toxicity_delta, extra_metrics={
+        "health_slope": round(least_squares_slope(health_points), 2),
+        "toxicity_slope": round(least_squares_slope(toxicity_points), 2),
+        "analyses_tracked": stats.count
+    })
@@ -0,0 +1,109 @@
+import os
+import json
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+from cachetools import LRUCache
+
+CACHE_SIZE = int(os.getenv("TOXICITY_CACHE_SIZE", "100000"))
+# Optional on-disk store shared by restarts and workers, e.g. /var/lib/convoq/verdicts.db
+CACHE_DB = os.getenv("TOXICITY_CACHE_DB")
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def verdict_key(text: str) -> str:
+    """Content address of a message: hash of its lower-cased, whitespace-normalized text"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Toxicity verdicts (label -> score) keyed by verdict_key.
+    In-memory LRU first, optional SQLite store behind it. Async callers use
+    aget_many / aput_many, which run the SQLite queries in a worker thread;
+    the lock serializes them on the shared connection.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, db_path: Optional[str] = CACHE_DB):
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, scores TEXT NOT NULL)")
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Repeats inside one chat that were never sent twice
+        self.deduplicated = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                scores = self._memory.get(key)
+                if scores is None:
+                    missing.append(key)
+                else:
+                    found[key] = scores
+            self.memory_hits += len(found)
+
+            disk_found = 0
+            if self._db is not None and missing:
+                for i in range(0, len(missing), _SQL_BATCH):
+                    batch = missing[i:i + _SQL_BATCH]
+                    rows = self._db.execute(
+                        f"SELECT key, scores FROM verdicts WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    for key, raw in rows:
+                        found[key] = self._memory[key] = json.loads(raw)
+                        disk_found += 1
+
+            self.disk_hits += disk_found
+            self.misses += len(missing) - disk_found
+        return found
+
+    def put_many(self, verdicts: Dict[str, Dict[str, float]]):
+        if not verdicts:
+            return
+        with self._lock:
+            for key, scores in verdicts.items():
+                self._memory[key] = scores
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO verdicts (key, scores) VALUES (?, ?)",
+                    [(key, json.dumps(scores)) for key, scores in verdicts.items()],
+                )
+                self._db.commit()
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        if self._db is None:
+            return self.get_many(keys)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_many, list(keys))
+
+    async def aput_many(self, verdicts: Dict[str, Dict[str, float]]):
+        if self._db is None:
+            return self.put_many(verdicts)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.put_many, verdicts)
+
+    def stats(self) -> Dict[str, int]:
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "remote_calls_saved": hits + self.deduplicated,
+            "size": len(self._memory),
+        }
@@ -0,0 +1,186 @@
+"""
+Pipeline benchmarks: wall time and peak memory of every analysis stage on
+synthetic chats of several sizes, checked against a stored baseline.
+
+    cd backend
+    python -m benchmarks.bench_pipeline                     # run, compare with baseline.json
+    python -m benchmarks.bench_pipeline --sizes 1000,10000  # a subset
+    python -m benchmarks.bench_pipeline --sizes 1000000     # the 1M run (tens of minutes traced)
+    python -m benchmarks.bench_pipeline --update-baseline   # record a new baseline
+
+Exits with status 1 when a stage is slower, or peaks higher, than its
+baseline by more than the thresholds. Baselines are machine specific:
+record one on the machine that runs the check.
+"""
+import io
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from app.services import sentiment
+from app.services.parser import parse_chat, parse_chat_store
+from app.services.analysis import reply_time_analysis
+from app.services.sentiment import analyze_sentiment, sentiment_timeline, sentiment_scores
+from app.services.initiation_analysis import initiation_analysis
+from app.services.semantic import build_chunks, filter_suspicious_chunks
+from app.services.features import calculate_features
+from benchmarks.chatgen import generate_chat
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# 1M messages is supported but only run on request (--sizes)
+SIZES = [1_000, 10_000, 100_000]
+# parse_chat builds one pydantic model per message; past this size it is skipped
+LEGACY_MAX = 100_000
+# Stages under these are too small to judge and never fail the check
+MIN_SECONDS = 0.005
+MIN_PEAK_MIB = 1.0
+
+
+def synthetic_chat(n: int, seed: int = 7) -> str:
+    """A reproducible two-person Android export of n messages"""
+    return generate_chat(n, participants=2, seed=seed)
+
+
+def pipeline(text: str, size: int) -> List[Tuple[str, Callable[[Dict], object]]]:
+    """(stage, fn(ctx)) in order; each stage reads earlier outputs from ctx"""
+    data = text.encode("utf-8")
+
+    def run_sentiment(ctx):
+        # Cold start: no shared or per-chat scores from an earlier repeat
+        sentiment.common_scores.clear()
+        return analyze_sentiment(ctx["store"])
+
+    stages = []
+    if size <= LEGACY_MAX:
+        stages.append(("parse_chat", lambda ctx: parse_chat(text)))
+    stages += [
+        ("parse_chat_store", lambda ctx: parse_chat_store(io.BytesIO(data))),
+        ("reply_time_analysis", lambda ctx: reply_time_analysis(ctx["store"])),
+        ("analyze_sentiment", run_sentiment),
+        ("sentiment_timeline", lambda ctx: sentiment_timeline(ctx["analyze_sentiment"])),
+        ("initiation_analysis", lambda ctx: initiation_analysis(ctx["store"], gap_hours=6)),
+        ("build_chunks", lambda ctx: build_chunks(ctx["store"], 20)),
+        ("filter_suspicious_chunks", lambda ctx: filter_suspicious_chunks(ctx["build_chunks"], None, scores=sentiment_scores(ctx["store"]))),
+        ("calculate_features", lambda ctx: calculate_features(
+            ctx["store"], ctx["reply_time_analysis"], ctx["analyze_sentiment"], ctx["initiation_analysis"], {"toxicity_rate": 0.0}
+        )),
+    ]
+    return stages
+
+
+def run_once(stages, trace: bool) -> Dict[str, float]:
+    """Seconds per stage, or peak MiB above the stage's starting point when tracing"""
+    ctx = {}
+    measured = {}
+    for name, fn in stages:
+        gc.collect()
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = fn(ctx)
+            measured[name] = (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20
+        else:
+            start = time.perf_counter()
+            result = fn(ctx)
+            measured[name] = time.perf_counter() - start
+
+        if name == "parse_chat":
+            del result  # Only measured; the rest of the pipeline uses the store
+        else:
+            ctx["store" if name == "parse_chat_store" else name] = result
+    return measured
+
+
+def bench_size(size: int, repeat: int, make_chat: Callable[[int], str] = synthetic_chat) -> Dict[str, Dict[str, float]]:
+    text = make_chat(size)
+    stages = pipeline(text, size)
+
+    # Best of `repeat` untraced runs for time; one traced run for memory
+    runs = repeat if size <= 100_000 else 1
+    times = [run_once(stages, trace=False) for _ in range(runs)]
+    tracemalloc.start()
+    try:
+        peaks = run_once(stages, trace=True)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        name: {
+            "seconds": round(min(t[name] for t in times), 6),
+            "peak_mib": round(peaks[name], 3),
+        }
+        for name, _ in stages
+    }
+
+
+def compare(results: Dict, baseline: Dict, time_threshold: float, memory_threshold: float) -> List[str]:
+    failures = []
+    for size, stages in results.items():
+        for name, now in stages.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            if now["seconds"] > MIN_SECONDS and now["seconds"] > before["seconds"] * (1 + time_threshold):
+                failures.append(f"{name} @ {size}: {now['seconds']:.4f}s vs baseline {before['seconds']:.4f}s")
+            if now["peak_mib"] > MIN_PEAK_MIB and now["peak_mib"] > before["peak_mib"] * (1 + memory_threshold):
+                failures.append(f"{name} @ {size}: peak {now['peak_mib']:.1f} MiB vs baseline {before['peak_mib']:.1f} MiB")
+    return failures
+
+
+def print_table(results: Dict, baseline: Dict):
+    print(f"{'size':>9}  {'stage':<26}{'seconds':>10}{'base':>10}{'peak MiB':>11}{'base':>10}")
+    for size, stages in results.items():
+        for name, now in stages.items():
+            before = baseline.get(size, {}).get(name, {})
+            base_s = f"{before['seconds']:.4f}" if before else "-"
+            base_m = f"{before['peak_mib']:.1f}" if before else "-"
+            print(f"{size:>9}  {name:<26}{now['seconds']:>10.4f}{base_s:>10}{now['peak_mib']:>11.1f}{base_m:>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated message counts")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size up to 100k (best is kept)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--time-threshold", type=float, default=0.3, help="allowed slowdown, 0.3 = +30%%")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="allowed peak memory growth")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = {}
+    for size in sizes:
+        print(f"benchmarking {size} messages...", file=sys.stderr)
+        results[str(size)] = bench_size(size, args.repeat)
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = stored.get("results", {})
+    print_table(results, baseline)
+
+    if args.update_baseline:
+        stored = {
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+            "results": {**baseline, **results},
+        }
+        args.baseline.write_text(json.dumps(stored, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("no baseline yet; run with --update-baseline")
+        return 0
+
+    failures = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
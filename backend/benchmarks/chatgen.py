@@ -0,0 +1,208 @@
+"""
+Seeded synthetic WhatsApp exports for load and scale tests.
+
+    cd backend
+    python -m benchmarks.chatgen -n 100000 -o /tmp/chat.txt
+    python -m benchmarks.chatgen -n 5000 --layout ios_24h_dmy_yyyy --participants 12 --seed 3
+    python -m benchmarks.chatgen --list-layouts
+
+Every layout the parser accepts can be produced: Android ("date, time - ")
+and iOS ("[date, time] ") headers, 12h and 24h clocks, day- or month-first
+dates, 2- or 4-digit years. Chats have bursty conversations separated by
+long gaps, quiet nights, multi-line messages, emoji, media placeholders,
+deleted messages, system lines and the occasional heated argument. The
+same arguments and seed always give the same export.
+"""
+import sys
+import math
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, TextIO
+
+
+class Layout:
+    """How one export flavour writes a message header"""
+
+    def __init__(self, platform: str, clock: str, order: str, year: str):
+        self.name = f"{platform}_{clock}_{order}_{year}"
+        self.platform = platform
+        self.clock = clock
+        self.order = order
+        self.year = year
+
+    def header(self, t: datetime, lowercase_ampm: bool = False) -> str:
+        y = f"{t.year:04d}" if self.year == "yyyy" else f"{t.year % 100:02d}"
+        if self.order == "dmy":
+            date = f"{t.day:02d}/{t.month:02d}/{y}"
+        else:
+            date = f"{t.month:02d}/{t.day:02d}/{y}"
+
+        # iOS writes seconds; Android does not
+        seconds = f":{t.second:02d}" if self.platform == "ios" else ""
+        if self.clock == "12h":
+            hour = t.hour % 12 or 12
+            ampm = "AM" if t.hour < 12 else "PM"
+            if lowercase_ampm:
+                ampm = ampm.lower()
+            clock = f"{hour}:{t.minute:02d}{seconds} {ampm}"
+        else:
+            clock = f"{t.hour:02d}:{t.minute:02d}{seconds}"
+
+        if self.platform == "ios":
+            return f"[{date}, {clock}] "
+        return f"{date}, {clock} - "
+
+
+LAYOUTS: Dict[str, Layout] = {
+    layout.name: layout
+    for layout in (
+        Layout(platform, clock, order, year)
+        for platform in ("android", "ios")
+        for clock in ("12h", "24h")
+        for order in ("mdy", "dmy")
+        for year in ("yy", "yyyy")
+    )
+}
+DEFAULT_LAYOUT = "android_12h_mdy_yy"
+
+NAMES = [
+    "Alice", "Bob", "Priya", "Rahul", "Sofia", "Mateo", "Aisha", "Chen Wei", "Emma", "Liam",
+    "Fatima", "Noah", "Yuki", "Olu", "Ines", "Arjun", "Zara", "Lucas", "Mia", "Omar",
+]
+
+NEUTRAL = [
+    "ok", "sure", "on my way", "where are you", "see you at 7", "did you eat", "what time tomorrow",
+    "lol", "haha", "hmm", "wait what", "send me the address", "call me when you're free", "k",
+    "just woke up", "in a meeting", "ya", "brb", "let me check", "what are you doing this weekend",
+]
+POSITIVE = [
+    "love this", "that's amazing!!", "thank you so much", "you're the best", "haha so funny",
+    "can't wait to see you", "miss you", "good morning ☀️", "proud of you", "this made my day",
+]
+NEGATIVE = [
+    "why are you ignoring me", "whatever", "stop", "this is so annoying", "you never listen",
+    "i'm done", "wtf", "that was really rude", "i hate when you do this", "bruh seriously",
+    "forget it", "you always do this", "leave me alone",
+]
+EMOJI = ["😂", "❤️", "😊", "👍", "🎉", "😭", "🙄", "🔥", "😡", "🥺", "🙏"]
+MEDIA_ANDROID = ["<Media omitted>", "<Media omitted>", "This message was deleted", "null"]
+MEDIA_IOS = ["‎image omitted", "‎video omitted", "‎sticker omitted", "‎audio omitted", "This message was deleted."]
+CONTINUATIONS = [
+    "also", "and bring the charger", "nvm", "ignore that", "i mean it", "for real",
+    "- milk\n- eggs\n- bread", "1. tickets\n2. hotel", "anyway",
+]
+
+
+def _text(rng: random.Random, mood: str) -> str:
+    pool = {"neutral": NEUTRAL, "positive": POSITIVE, "negative": NEGATIVE}[mood]
+    text = rng.choice(pool)
+    if rng.random() < 0.3:
+        text += " " + rng.choice(pool)
+    if rng.random() < 0.25:
+        text += " " + rng.choice(EMOJI) * rng.randint(1, 3)
+    if rng.random() < 0.1:
+        text = text.capitalize()
+    return text
+
+
+def iter_chat_lines(
+    n_messages: int,
+    layout: str = DEFAULT_LAYOUT,
+    participants: int = 2,
+    seed: int = 0,
+    start: Optional[datetime] = None,
+) -> Iterator[str]:
+    """Lines of an export with n_messages messages (multi-line messages span several lines)"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    fmt = LAYOUTS[layout]
+    rng = random.Random(seed)
+
+    senders = (NAMES * (participants // len(NAMES) + 1))[:participants]
+    senders = [name if i < len(NAMES) else f"{name} {i // len(NAMES) + 1}" for i, name in enumerate(senders)]
+    # A few people do most of the talking in groups (Zipf-like weights)
+    weights = [1 / (rank + 1) for rank in range(participants)]
+    media = MEDIA_IOS if fmt.platform == "ios" else MEDIA_ANDROID
+    lowercase_ampm = fmt.platform == "android" and rng.random() < 0.5
+
+    t = start or datetime(2022, 1, 1, 9, 0, 0)
+    if fmt.platform == "android":
+        yield fmt.header(t, lowercase_ampm) + "Messages and calls are end-to-end encrypted. No one outside of this chat, not even WhatsApp, can read or listen to them."
+    if participants > 2:
+        yield fmt.header(t, lowercase_ampm) + f"{senders[0]} created group \"Weekend plans\""
+
+    sent = 0
+    sender = senders[0]
+    while sent < n_messages:
+        # One conversation: a burst of messages, mostly short gaps
+        mood = rng.choices(["neutral", "positive", "negative"], weights=[6, 3, 1])[0]
+        burst = min(n_messages - sent, max(1, int(rng.expovariate(1 / 25))))
+        for _ in range(burst):
+            # Replies usually switch speaker; people also double-text
+            if rng.random() < 0.65:
+                sender = rng.choices(senders, weights=weights)[0]
+            t += timedelta(seconds=int(rng.expovariate(1 / 45)) + 1)
+
+            roll = rng.random()
+            if roll < 0.04:
+                text = rng.choice(media)
+            else:
+                text = _text(rng, mood)
+                if roll > 0.97:
+                    # Multi-line message
+                    text += "\n" + rng.choice(CONTINUATIONS)
+
+            yield fmt.header(t, lowercase_ampm) + f"{sender}: {text}"
+            sent += 1
+
+            if participants > 2 and rng.random() < 0.002:
+                who = rng.choice(senders)
+                yield fmt.header(t, lowercase_ampm) + rng.choice([f"{senders[0]} added {who}", f"{who} left", f"{who} changed the group description"])
+
+        # Gap until the next conversation: minutes to days, skipping the night
+        gap_hours = rng.lognormvariate(math.log(3), 1.2)
+        if rng.random() < 0.02:
+            gap_hours += rng.uniform(48, 24 * 14)  # someone went quiet for days
+        t += timedelta(hours=gap_hours)
+        if 1 <= t.hour < 7:
+            t = t.replace(hour=7 + rng.randint(0, 3), minute=rng.randint(0, 59))
+
+
+def generate_chat(n_messages: int, layout: str = DEFAULT_LAYOUT, participants: int = 2, seed: int = 0, start: Optional[datetime] = None) -> str:
+    return "\n".join(iter_chat_lines(n_messages, layout, participants, seed, start))
+
+
+def write_chat(out: TextIO, n_messages: int, **kwargs):
+    """Stream an export to a file without holding it in memory"""
+    for line in iter_chat_lines(n_messages, **kwargs):
+        out.write(line)
+        out.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--messages", type=int, default=1000)
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, choices=sorted(LAYOUTS))
+    parser.add_argument("--participants", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    parser.add_argument("--list-layouts", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list_layouts:
+        for name, layout in sorted(LAYOUTS.items()):
+            print(f"{name:<22} {layout.header(datetime(2024, 3, 9, 21, 5, 7)).strip()}")
+        return 0
+
+    kwargs = dict(layout=args.layout, participants=args.participants, seed=args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            write_chat(out, args.messages, **kwargs)
+    else:
+        write_chat(sys.stdout, args.messages, **kwargs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
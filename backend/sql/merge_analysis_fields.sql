@@ -0,0 +1,42 @@
+-- Optimistic version for analyses rows; bumped by every merge
+alter table analyses add column if not exists version integer not null default 0;
+
+-- Merge top-level keys of p_patch into full_data in one statement.
+-- Only the owner's row (p_user_id) is touched; anyone else's is reported as not_found.
+-- With p_expected_version set, the merge only applies if the row is still at that version.
+-- Returns {"status": "ok" | "conflict" | "not_found", "version": <current version>}.
+drop function if exists merge_analysis_fields(uuid, jsonb, double precision, integer);
+drop function if exists merge_analysis_fields(bigint, jsonb, double precision, integer);
+
+create or replace function merge_analysis_fields(
+    p_id bigint,
+    p_user_id uuid,
+    p_patch jsonb,
+    p_health_score double precision default null,
+    p_expected_version integer default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_version integer;
+begin
+    update analyses
+       set full_data = coalesce(full_data, '{}'::jsonb) || p_patch,
+           health_score = coalesce(p_health_score, health_score),
+           version = version + 1
+     where id = p_id
+       and user_id = p_user_id
+       and (p_expected_version is null or version = p_expected_version)
+    returning version into v_version;
+
+    if found then
+        return jsonb_build_object('status', 'ok', 'version', v_version);
+    end if;
+
+    select version into v_version from analyses where id = p_id and user_id = p_user_id;
+    if not found then
+        return jsonb_build_object('status', 'not_found');
+    end if;
+    return jsonb_build_object('status', 'conflict', 'version', v_version);
+end;
+$$;
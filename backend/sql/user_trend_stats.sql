@@ -0,0 +1,17 @@
+-- Rolling per-user trend record, updated once per completed deep analysis
+-- (see app/services/trend_analysis.py: TrendStats)
+create table if not exists user_trend_stats (
+    user_id uuid primary key references users(id) on delete cascade,
+    count integer not null default 0,
+    health_ewma double precision not null default 0,
+    toxicity_ewma double precision not null default 0,
+    -- last TREND_WINDOW points: [[analysis_id, health_score, toxicity_rate], ...]
+    "window" jsonb not null default '[]'::jsonb,
+    last_analysis_id text,
+    -- the record before the last update (lets a re-run replace its own point)
+    prior jsonb,
+    updated_at timestamptz not null default now()
+);
+
+-- Optimistic version; every save is conditional on the version it read
+alter table user_trend_stats add column if not exists version integer not null default 0;
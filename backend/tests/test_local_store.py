@@ -0,0 +1,67 @@
+import pytest
+
+from app.services.local_store import SQLiteAnalysisStore
+from app.services.repository import AnalysisNotFound, VersionConflict
+
+
+@pytest.fixture
+def store():
+    return SQLiteAnalysisStore()
+
+
+@pytest.fixture
+def analysis(store):
+    return store.insert_analysis({
+        "user_id": "owner",
+        "total_messages": 3,
+        "health_score": 0.5,
+        "full_data": {"analysis_status": "pending_deep", "features": {"a": 1}},
+    })
+
+
+def test_insert_assigns_integer_ids(store, analysis):
+    other = store.insert_analysis({"user_id": "owner", "full_data": {}})
+    assert isinstance(analysis["id"], int)
+    assert other["id"] > analysis["id"]
+    assert analysis["version"] == 0
+
+
+def test_merge_replaces_top_level_keys_and_bumps_version(store, analysis):
+    version = store.merge_analysis_fields(
+        "owner", analysis["id"], {"features": {"b": 2}, "analysis_status": "complete"},
+        health_score=0.8, expected_version=0
+    )
+
+    row = store.get_analysis(analysis["id"])
+    assert version == row["version"] == 1
+    # Whole values are replaced, not merged recursively
+    assert row["full_data"] == {"analysis_status": "complete", "features": {"b": 2}}
+    assert row["health_score"] == 0.8
+
+
+def test_merge_without_expected_version_always_applies(store, analysis):
+    store.merge_analysis_fields("owner", analysis["id"], {"x": 1})
+    assert store.merge_analysis_fields("owner", analysis["id"], {"x": 2}) == 2
+
+
+def test_stale_version_raises_conflict(store, analysis):
+    store.merge_analysis_fields("owner", analysis["id"], {"x": 1}, expected_version=0)
+
+    with pytest.raises(VersionConflict) as exc:
+        store.merge_analysis_fields("owner", analysis["id"], {"x": 2}, expected_version=0)
+    assert exc.value.current_version == 1
+    assert store.get_analysis(analysis["id"])["full_data"]["x"] == 1
+
+
+def test_missing_analysis_raises_not_found(store, analysis):
+    with pytest.raises(AnalysisNotFound):
+        store.merge_analysis_fields("owner", analysis["id"] + 1, {"x": 1})
+
+
+def test_other_users_analysis_is_not_found_and_untouched(store, analysis):
+    with pytest.raises(AnalysisNotFound):
+        store.merge_analysis_fields("intruder", analysis["id"], {"x": 1}, expected_version=0)
+
+    row = store.get_analysis(analysis["id"])
+    assert row["version"] == 0
+    assert "x" not in row["full_data"]
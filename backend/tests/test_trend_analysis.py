@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.trend_analysis import TrendStats, evaluate_trends_from_stats
+
+
+def snapshot(health, toxicity=0.0):
+    return {"health_score": health, "toxicity": toxicity}
+
+
+def current(health, toxicity=0.0):
+    return {"health_score": health, "toxicity": {"toxicity_rate": toxicity}, "features": {}}
+
+
+def record(points, alpha=0.5):
+    """TrendStats after analyses 1, 2, ... with these (health, toxicity) points, in order"""
+    stats = TrendStats()
+    for analysis_id, (health, toxicity) in enumerate(points, start=1):
+        stats = stats.updated(analysis_id, snapshot(health, toxicity), alpha=alpha)
+    return stats
+
+
+def test_rerun_of_last_analysis_replaces_its_point():
+    stats = record([(80, 0), (60, 5)])
+    rerun = stats.updated(2, snapshot(70, 1))
+
+    assert rerun.count == 2
+    assert rerun.window == [["1", 80, 0], ["2", 70, 1]]
+    assert rerun.health_ewma == pytest.approx(75)
+
+
+def test_rerun_of_older_analysis_is_not_counted_again():
+    stats = record([(80, 0), (60, 5), (70, 1)])
+    assert stats.updated(2, snapshot(60, 5)) is stats
+
+
+def test_rerun_of_older_analysis_is_compared_without_its_own_point():
+    # Every chat but the second is at 50: without it, the others average exactly 50
+    stats = record([(50, 2), (90, 20), (50, 2), (50, 2)])
+    others = stats.excluding(2)
+
+    assert others.count == 3
+    assert [point[0] for point in others.window] == ["1", "3", "4"]
+    assert others.health_ewma == pytest.approx(50)
+    assert others.toxicity_ewma == pytest.approx(2)
+
+    trends = evaluate_trends_from_stats(current(90, 20), others)
+    assert trends["metrics_delta"]["health_change"] == pytest.approx(40)
+    assert trends["metrics_delta"]["toxicity_change"] == pytest.approx(18)
+    assert trends["metrics_delta"]["analyses_tracked"] == 3
+
+
+def test_excluding_the_first_analysis_removes_its_seed_weight():
+    stats = record([(90, 0), (50, 0), (50, 0)])
+    assert stats.excluding(1).health_ewma == pytest.approx(50)
+
+
+def test_excluding_the_only_analysis_leaves_no_data():
+    stats = record([(70, 0)])
+    # The last update is undone from `prior`
+    assert stats.excluding(1).count == 0
+    assert evaluate_trends_from_stats(current(70), stats.excluding(1))["decision"] == "Not Enough Data"
+
+
+def test_excluding_an_unknown_analysis_keeps_the_record():
+    stats = record([(80, 0), (60, 5)])
+    assert stats.excluding(99) is stats
@@ -1,27 +1,18 @@
-import React, { useEffect, useState } from 'react';
-import { getHistory } from '../services/api';
-import { useAuth } from '@clerk/clerk-react';
+import React, { useState } from 'react';
 import { Clock, MessageSquare, Activity } from 'lucide-react';
 
-const HistoryList = ({ onSelect }) => {
-  const [history, setHistory] = useState([]);
-  const [loading, setLoading] = useState(true);
-  const { getToken } = useAuth();
+// History is fetched by the Dashboard (so new uploads show up); this only renders it
+const HistoryList = ({ history, loading, hasMore, onLoadMore, onSelect }) => {
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const token = await getToken();
-        const data = await getHistory(token);
-        setHistory(data);
-      } catch (err) {
-        console.error("History fetch failed", err);
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchHistory();
-  }, []); // Only fetch on mount
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await onLoadMore();
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   // Let's stick to simple styling first. Using 'key={index}' is bad practice, prefer 'item.id' if available.
 
@@ -66,6 +57,16 @@ const HistoryList = ({ onSelect }) => {
           </div>
         ))
       )}
+
+      {hasMore && (
+        <button
+          onClick={handleLoadMore}
+          disabled={loadingMore}
+          className="w-full py-2 text-xs font-semibold text-slate-400 hover:text-purple-300 rounded-xl border border-white/5 hover:border-purple-500/30 transition-colors disabled:opacity-50"
+        >
+          {loadingMore ? 'Loading...' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 };
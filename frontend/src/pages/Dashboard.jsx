@@ -14,17 +14,19 @@ import HistoryList from '../components/HistoryList';
 import CoachSummary from '../components/CoachSummary';
 import SemanticVibeCheck from '../components/SemanticVibeCheck';
 import RelationshipHealthGrid from '../components/RelationshipHealthGrid';
-import { getCompleteAnalysis, getHistory, getDeepAnalysis } from '../services/api';
+import { getCompleteAnalysis, getHistory, getDeepAnalysis, getAnalysisDetail } from '../services/api';
 
 const Dashboard = () => {
     const [analysisData, setAnalysisData] = useState(null);
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState(null);
-    const [, setHistory] = useState([]); // Used to trigger updates
+    const [history, setHistory] = useState([]);
+    const [historyCursor, setHistoryCursor] = useState(null);
+    const [historyLoading, setHistoryLoading] = useState(true);
 
     const [token, setToken] = useState(null);
     const [deepLoading, setDeepLoading] = useState(false);
-    const [analysisKeys, setAnalysisKeys] = useState({ cacheKey: null, analysisId: null });
+    const [analysisKeys, setAnalysisKeys] = useState({ cacheKey: null, analysisId: null, version: null });
 
     const { user } = useUser();
     const { getToken } = useAuth();
@@ -37,13 +39,29 @@ const Dashboard = () => {
         if (user) initToken();
     }, [user]);
 
+    // Reloads the first page; older pages are appended by loadMoreHistory
     const loadHistory = async () => {
         try {
             const token = await getToken();
-            const data = await getHistory(token);
-            setHistory(data);
+            const { items, nextCursor } = await getHistory(token);
+            setHistory(items);
+            setHistoryCursor(nextCursor);
         } catch (err) {
             console.error('Failed to load history:', err);
+        } finally {
+            setHistoryLoading(false);
+        }
+    };
+
+    const loadMoreHistory = async () => {
+        if (!historyCursor) return;
+        try {
+            const token = await getToken();
+            const { items, nextCursor } = await getHistory(token, historyCursor);
+            setHistory(prev => [...prev, ...items]);
+            setHistoryCursor(nextCursor);
+        } catch (err) {
+            console.error('Failed to load more history:', err);
         }
     };
 
@@ -58,7 +76,7 @@ const Dashboard = () => {
             const token = await getToken();
             const data = await getCompleteAnalysis(file, token, dateFormat);
             if (data.cache_key) {
-                setAnalysisKeys({ cacheKey: data.cache_key, analysisId: data.analysis_id });
+                setAnalysisKeys({ cacheKey: data.cache_key, analysisId: data.analysis_id, version: data.version });
             }
             setAnalysisData(data);
             loadHistory();
@@ -75,7 +93,8 @@ const Dashboard = () => {
         setDeepLoading(true);
         try {
             const token = await getToken();
-            const deepData = await getDeepAnalysis(analysisKeys.cacheKey, analysisKeys.analysisId, token);
+            const deepData = await getDeepAnalysis(analysisKeys.cacheKey, analysisKeys.analysisId, token, analysisKeys.version);
+            setAnalysisKeys(prev => ({ ...prev, version: deepData.version }));
 
             // Merge deep data into current analysisData
             setAnalysisData(prev => ({
@@ -97,7 +116,18 @@ const Dashboard = () => {
         }
     };
 
-    const handleSelectAnalysis = (item) => {
+    const handleSelectAnalysis = async (item) => {
+        // History items are summaries; the full analysis is fetched on demand
+        if (!item.full_data && item.id) {
+            try {
+                const token = await getToken();
+                item = await getAnalysisDetail(item.id, token);
+            } catch (err) {
+                setError("Failed to load analysis.");
+                return;
+            }
+        }
+
         const sourceData = item.full_data || item.analysis_results;
 
         if (!sourceData) {
@@ -134,7 +164,13 @@ const Dashboard = () => {
                         {/* History */}
                         <div className="bg-slate-900/50 backdrop-blur-md rounded-2xl border border-white/10 p-4 sticky top-24 max-h-[calc(100vh-240px)] overflow-y-auto">
                             <h3 className="text-sm font-semibold text-slate-400 uppercase tracking-wider mb-4 px-2">History</h3>
-                            <HistoryList onSelect={handleSelectAnalysis} />
+                            <HistoryList
+                                history={history}
+                                loading={historyLoading}
+                                hasMore={Boolean(historyCursor)}
+                                onLoadMore={loadMoreHistory}
+                                onSelect={handleSelectAnalysis}
+                            />
                         </div>
                     </div>
                 </div>
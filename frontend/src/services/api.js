@@ -18,10 +18,11 @@ export const getCompleteAnalysis = async (file, token, dateFormat = 'auto') => {
 };
 
 // Deep Analysis
-export const getDeepAnalysis = async (cacheKey, analysisId, token) => {
+export const getDeepAnalysis = async (cacheKey, analysisId, token, version = null) => {
   const response = await axios.post(`${API_BASE_URL}/analyze/deep`, {
     cache_key: cacheKey,
-    analysis_id: analysisId
+    analysis_id: analysisId,
+    version
   }, {
     headers: {
       'Authorization': `Bearer ${token}`,
@@ -32,8 +33,10 @@ export const getDeepAnalysis = async (cacheKey, analysisId, token) => {
   return response.data;
 };
 
-export const getHistory = async (token) => {
-  const response = await fetch(`${API_BASE_URL}/history`, {
+// One page of history summaries, newest first; pass `nextCursor` back as `cursor` for older ones
+export const getHistory = async (token, cursor = null) => {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+  const response = await fetch(`${API_BASE_URL}/history${query}`, {
     method: 'GET',
     headers: {
       'Authorization': `Bearer ${token}`,
@@ -41,5 +44,21 @@ export const getHistory = async (token) => {
   });
 
   if (!response.ok) throw new Error('Failed to fetch history');
+  return {
+    items: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  };
+};
+
+// One analysis including its full_data
+export const getAnalysisDetail = async (analysisId, token) => {
+  const response = await fetch(`${API_BASE_URL}/history/${analysisId}`, {
+    method: 'GET',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+    },
+  });
+
+  if (!response.ok) throw new Error('Failed to fetch analysis');
   return response.json();
 };